@@ -1,6 +1,8 @@
 from User import User
 
 class Admin(User):
+    __slots__ = ('name',)
+
     def __init__(self, username, password, name):
         super().__init__(username, password, 'admin')
         self.name = name
\ No newline at end of file
@@ -1,6 +1,8 @@
 from User import User
 
 class Customer(User):
+    __slots__ = ('name', 'membership_level', 'budget')
+
     def __init__(self, username, password, name, membership_level, budget):
         super().__init__(username, password, 'customer')
         self.name = name
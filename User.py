@@ -1,4 +1,6 @@
 class User:
+    __slots__ = ('username', 'password', 'role')
+
     def __init__(self, username, password, role):
         self.username = username
         self.password = password
@@ -0,0 +1,118 @@
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pricing import DISCOUNTS
+from transaction_store import TransactionStore
+
+#discount rate -> membership level, transactions only keep the rate
+LEVELS = {discount: level for level, discount in DISCOUNTS.items()}
+
+
+def customer_spend(store):
+    totals = {}
+    names = store.names
+    for user_id, final_cost in zip(store.user_ids, store.final_costs):
+        totals[user_id] = totals.get(user_id, 0) + final_cost
+    return {names[user_id]: total for user_id, total in totals.items()}
+
+
+def product_quantities(store):
+    totals = {}
+    for product_index, quantity in zip(store.product_indexes, store.quantities):
+        totals[product_index] = totals.get(product_index, 0) + quantity
+    return totals
+
+
+def discount_by_level(store):
+    totals = {}
+    for discount, discounted_cost in zip(store.discounts, store.discounted_costs):
+        totals[discount] = totals.get(discount, 0) + discounted_cost
+    return {LEVELS.get(discount, discount): total for discount, total in totals.items()}
+
+
+#every query maps one partition to {key: total}; the totals are then added up
+QUERIES = {
+    'customer_spend': customer_spend,
+    'product_quantities': product_quantities,
+    'discount_by_level': discount_by_level,
+}
+
+
+def merge(results):
+    merged = {}
+    for result in results:
+        for key, total in result.items():
+            merged[key] = merged.get(key, 0) + total
+    return merged
+
+
+def slice_store(store, start, stop):
+    part = TransactionStore()
+    #user ids keep pointing into the same list of names
+    part.names = store.names
+    part.name_ids = store.name_ids
+    for column, source in zip(part.columns(), store.columns()):
+        column.extend(source[start:stop])
+    return part
+
+
+def select_store(store, positions):
+    part = TransactionStore()
+    part.names = store.names
+    part.name_ids = store.name_ids
+    for column, source in zip(part.columns(), store.columns()):
+        column.extend(array(source.typecode, map(source.__getitem__, positions)))
+    return part
+
+
+def run_partition(query, path):
+    with open(path, "rb") as file:
+        store = TransactionStore.read(file)
+    return QUERIES[query](store)
+
+
+#The transaction history split into partitions, each saved in the binary
+#snapshot format of TransactionStore. Queries run as map-reduce: every worker
+#process reads one partition file and sends back only its totals, so the
+#rows never have to be pickled between processes.
+#  by="date"      consecutive runs of rows; the history is in date order, so
+#                 every partition covers one period of time
+#  by="username"  all purchases of a customer end up in the same partition
+class PartitionedHistory:
+    def __init__(self, directory, paths, by):
+        self.directory = directory
+        self.paths = paths
+        self.by = by
+
+    #rows limits the partitions to the first rows, e.g. while more are being appended
+    @classmethod
+    def create(cls, store, directory, by="date", partitions=8, rows=None):
+        rows = len(store) if rows is None else rows
+        if by == "date":
+            size = -(-rows // partitions) or 1
+            parts = (slice_store(store, start, min(start + size, rows)) for start in range(0, rows, size))
+        elif by == "username":
+            buckets = [array('Q') for _ in range(partitions)]
+            for position, user_id in enumerate(store.user_ids[:rows]):
+                buckets[user_id % partitions].append(position)
+            parts = (select_store(store, positions) for positions in buckets if positions)
+        else:
+            raise ValueError(f"Unknown partitioning: {by}")
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        #one partition at a time is held in memory next to the store
+        for number, part in enumerate(parts):
+            path = os.path.join(directory, f"transactions-{by}-{number}.bin")
+            with open(path, "wb") as file:
+                part.write(file)
+            paths.append(path)
+        return cls(directory, paths, by)
+
+    def run(self, query, workers=None):
+        if query not in QUERIES:
+            raise ValueError(f"Unknown query: {query}")
+        if workers == 1:
+            return merge(run_partition(query, path) for path in self.paths)
+        with ProcessPoolExecutor(workers) as executor:
+            return merge(executor.map(run_partition, [query] * len(self.paths), self.paths))
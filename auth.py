@@ -0,0 +1,90 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from collections import OrderedDict
+
+
+#Passwords are stored as "scrypt$n$r$p$salt$hash" (or "pbkdf2_sha256$iterations$salt$hash"
+#where OpenSSL has no scrypt). The cost is part of every stored hash, so it
+#can be raised later: old hashes still verify and are rehashed on the next login.
+class PasswordHasher:
+    def __init__(self, n=2 ** 14, r=8, p=1, iterations=600000):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.iterations = iterations
+        self.algorithm = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+        #checked when the username does not exist, so a login takes as long either way
+        self.dummy_hash = self.hash("dummy password")
+
+    def hash(self, password, salt=None):
+        if salt is None:
+            salt = os.urandom(16)
+        if self.algorithm == "scrypt":
+            key = self.derive("scrypt", password, salt, (self.n, self.r, self.p))
+            return f"scrypt${self.n}${self.r}${self.p}${salt.hex()}${key.hex()}"
+        key = self.derive("pbkdf2_sha256", password, salt, (self.iterations,))
+        return f"pbkdf2_sha256${self.iterations}${salt.hex()}${key.hex()}"
+
+    @staticmethod
+    def derive(algorithm, password, salt, cost):
+        #both functions release the GIL, so verifications on several threads run in parallel
+        if algorithm == "scrypt":
+            n, r, p = cost
+            return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                                  maxmem=256 * r * (n + p + 2), dklen=32)
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, cost[0])
+
+    @staticmethod
+    def is_hashed(stored):
+        return stored.startswith(("scrypt$", "pbkdf2_sha256$"))
+
+    def verify(self, stored, password):
+        algorithm, *fields = stored.split("$")
+        if len(fields) != {"scrypt": 5, "pbkdf2_sha256": 3}.get(algorithm):
+            return False
+        try:
+            cost = tuple(int(field) for field in fields[:-2])
+            salt, key = bytes.fromhex(fields[-2]), bytes.fromhex(fields[-1])
+        except ValueError:
+            return False
+        return hmac.compare_digest(self.derive(algorithm, password, salt, cost), key)
+
+    def needs_rehash(self, stored):
+        if self.algorithm == "scrypt":
+            return not stored.startswith(f"scrypt${self.n}${self.r}${self.p}$")
+        return not stored.startswith(f"pbkdf2_sha256${self.iterations}$")
+
+
+#Session tokens of recently verified logins. A client sends its token
+#instead of the password, so the KDF only runs once per login. The oldest
+#sessions are dropped once there are more than capacity.
+class SessionCache:
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, username):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[token] = username
+            if len(self.sessions) > self.capacity:
+                self.sessions.popitem(last=False)
+        return token
+
+    def get(self, token):
+        with self.lock:
+            username = self.sessions.get(token)
+            if username is not None:
+                self.sessions.move_to_end(token)
+        return username
+
+    def remove(self, token):
+        with self.lock:
+            self.sessions.pop(token, None)
@@ -0,0 +1,747 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from Customer import Customer
+from product import Product
+from search import ProductSearchIndex
+from transaction import Transaction
+from transaction_store import TransactionStore
+from shop import OnlineShop, ShopError
+from server import ShopServer
+from cli import ShopCLI
+from storage import (JsonStorage, SqliteStorage, product_from_data, product_to_data, transaction_to_data,
+                     user_from_data, user_to_data, write_json)
+import pricing
+from catalog import export_products, import_products
+from auth import PasswordHasher
+from datagen import generate_dataset
+import analytics
+
+
+def make_products(count, seed=1, stock=1000000):
+    rng = random.Random(seed)
+    words = ["w%d" % i for i in range(20000)]
+    manufacturers = ["maker%d" % i for i in range(1000)]
+    remarks = ["r%d" % i for i in range(5000)]
+    for product_index in range(1, count + 1):
+        yield Product(product_index, " ".join(rng.sample(words, 2)), round(rng.uniform(1, 500), 2),
+                      rng.choice(manufacturers), rng.sample(remarks, 3), stock)
+
+
+def make_transaction_rows(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        quantity = rng.randint(1, 20)
+        total_cost = quantity * rng.uniform(1, 500)
+        discount = rng.choice((0, 0.05, 0.1, 0.15))
+        yield ("customer%d" % rng.randrange(10000), rng.randrange(1, 100000), quantity, total_cost, discount,
+               total_cost * discount, total_cost - total_cost * discount,
+               ("2023-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)),
+                "%02d:%02d:%02d" % (rng.randrange(24), rng.randrange(60), rng.randrange(60))))
+
+
+#the layout Transaction had before it used __slots__
+class DictTransaction:
+    def __init__(self, username, product_index, quantity, total_cost, discount, discounted_cost, final_cost, date):
+        self.username = username
+        self.product_index = product_index
+        self.quantity = quantity
+        self.total_cost = total_cost
+        self.discount = discount
+        self.discounted_cost = discounted_cost
+        self.final_cost = final_cost
+        self.date = tuple(date)
+
+
+def build_objects(cls, rows):
+    return [cls(*row) for row in rows]
+
+
+def build_store(rows):
+    store = TransactionStore()
+    for row in rows:
+        store.add(*row)
+    return store
+
+
+def traced_size(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build(rows)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def bench_memory(args):
+    layouts = {
+        "dict objects": lambda rows: build_objects(DictTransaction, rows),
+        "__slots__ objects": lambda rows: build_objects(Transaction, rows),
+        "column store": build_store,
+    }
+    for count in args.rows:
+        for name, build in layouts.items():
+            #object layouts do not fit in memory at the largest sizes, so
+            #they are measured on object_rows rows and scaled up
+            measured = count if name == "column store" else min(count, args.object_rows)
+            size = traced_size(build, make_transaction_rows(measured)) * count / measured
+            note = "" if measured == count else f" (scaled from {measured} rows)"
+            print(f"{count:>10} rows {name:>18}: {size / 2 ** 20:9.1f} MiB, "
+                  f"{size / count:6.1f} bytes/row{note}")
+
+
+def time_queries(index, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            index.search(query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+
+def bench_search(args):
+    index = ProductSearchIndex()
+    start = time.perf_counter()
+    products = args.products or 1000000
+    index.rebuild(make_products(products))
+    print(f"indexed {products} products in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(2)
+    cases = {
+        "single term": ["w%d" % rng.randrange(20000) for _ in range(200)],
+        "manufacturer AND remark": ["maker%d r%d" % (rng.randrange(1000), rng.randrange(5000)) for _ in range(200)],
+        "prefix": ["w%d*" % rng.randrange(1000, 2000) for _ in range(200)],
+        "prefix AND term": ["w%d* maker%d" % (rng.randrange(1000, 2000), rng.randrange(1000)) for _ in range(200)],
+    }
+    for name, queries in cases.items():
+        print(f"{name:>24}: {time_queries(index, queries, args.repeat) * 1000:.3f} ms/query")
+
+
+def percentile(latencies, fraction):
+    return latencies[int(fraction * (len(latencies) - 1))]
+
+
+def report_latencies(name, latencies, elapsed):
+    latencies.sort()
+    print(f"{name}: {len(latencies) / elapsed:,.0f} requests/s, p50 {percentile(latencies, 0.5) * 1000:.3f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.3f} ms, p99 {percentile(latencies, 0.99) * 1000:.3f} ms")
+
+
+def make_shop(directory, customers, products, storage="json"):
+    if storage == "sqlite":
+        shop = OnlineShop(SqliteStorage(os.path.join(directory, "shop.db")))
+    else:
+        shop = OnlineShop(JsonStorage(os.path.join(directory, "users.json"),
+                                      os.path.join(directory, "products.json"),
+                                      os.path.join(directory, "transactions.json")))
+        shop.storage.journal.path = os.path.join(directory, "journal.jsonl")
+    #one hash shared by every customer, a real one per customer would take minutes
+    password_hash = shop.passwords.hash("password")
+    for number in range(customers):
+        customer = Customer("customer%d" % number, password_hash, "customer %d" % number, number % 4, 1000000.0)
+        shop.users[customer.username] = customer
+        shop.storage.add_user(customer)
+    for product in make_products(products):
+        shop.products[product.product_index] = product
+        shop.storage.save_products([product])
+    shop.search_index.rebuild(shop.products.values())
+    #filled in directly, so the shop has to be told what to write
+    shop.changed.update(('users', 'products'))
+    shop.save_data()
+    return shop
+
+
+def client_requests(rng, session, products, count):
+    for _ in range(count):
+        if rng.random() < 0.1:
+            yield {'op': 'add_money', 'session': session, 'amount': 100}
+        else:
+            lines = [[rng.randint(1, products), rng.randint(1, 3)] for _ in range(rng.randint(1, 3))]
+            yield {'op': 'purchase', 'session': session, 'lines': lines}
+
+
+def check_response(request, response, deposits):
+    if response['ok']:
+        if request['op'] == 'add_money':
+            deposits.append(request['amount'])
+    elif response['error'] != "Insufficient budget.":
+        raise RuntimeError(response['error'])
+
+
+def run_inprocess_clients(server, sessions, args):
+    latencies = []
+    deposits = []
+
+    def client(number):
+        rng = random.Random(number)
+        own = []
+        for request in client_requests(rng, sessions[number], args.products or 1000, args.requests):
+            start = time.perf_counter()
+            response = server.handle(request)
+            own.append(time.perf_counter() - start)
+            check_response(request, response, deposits)
+        latencies.extend(own)
+
+    with ThreadPoolExecutor(args.clients) as pool:
+        list(pool.map(client, range(args.clients)))
+    return latencies, deposits
+
+
+async def run_socket_clients(server, sessions, args):
+    latencies = []
+    deposits = []
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+
+    async def client(number):
+        rng = random.Random(number)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for request in client_requests(rng, sessions[number], args.products or 1000, args.requests):
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            check_response(request, response, deposits)
+        writer.close()
+        await writer.wait_closed()
+
+    await asyncio.gather(*(client(number) for number in range(args.clients)))
+    listener.close()
+    await listener.wait_closed()
+    return latencies, deposits
+
+
+def bench_server(args):
+    with tempfile.TemporaryDirectory() as directory:
+        shop = make_shop(directory, args.customers, args.products or 1000, args.storage)
+        server = ShopServer(shop, args.workers)
+        #several clients share one account, so per-account locking is exercised
+        sessions = [server.handle({'op': 'login', 'username': "customer%d" % (number % args.customers),
+                                   'password': "password"})['session'] for number in range(args.clients)]
+        money_before = sum(customer.budget for customer in shop.users.values())
+
+        start = time.perf_counter()
+        if args.mode == "socket":
+            latencies, deposits = asyncio.run(run_socket_clients(server, sessions, args))
+        else:
+            latencies, deposits = run_inprocess_clients(server, sessions, args)
+        elapsed = time.perf_counter() - start
+
+        report_latencies(f"{args.mode} {args.clients} clients", latencies, elapsed)
+        #every deposit and every purchase has to be reflected in the budgets
+        money_after = sum(customer.budget for customer in shop.users.values())
+        spent = sum(shop.transactions.final_costs)
+        drift = money_before + sum(deposits) - spent - money_after
+        print(f"{len(shop.transactions)} transactions, budget drift {drift:.6f}")
+        shop.save_data()
+        shop.storage.close()
+
+
+def bench_login(args):
+    with tempfile.TemporaryDirectory() as directory:
+        shop = make_shop(directory, args.customers, 10, args.storage)
+        login_workers = args.login_workers or os.cpu_count()
+        server = ShopServer(shop, args.workers, login_workers)
+        logins = [{'op': 'login', 'username': "customer%d" % (number % args.customers), 'password': "password"}
+                  for number in range(args.clients)]
+
+        start = time.perf_counter()
+        sessions = [response['session'] for response in server.login_executor.map(server.handle, logins)]
+        elapsed = time.perf_counter() - start
+        print(f"{shop.passwords.algorithm} logins on {login_workers} threads: "
+              f"{len(sessions) / elapsed:,.1f} logins/s, {elapsed / len(sessions) * 1000:.1f} ms each")
+
+        #requests after the login only look up the session token
+        requests = [{'op': 'budget', 'session': sessions[number % len(sessions)]} for number in range(args.requests)]
+        start = time.perf_counter()
+        responses = list(server.executor.map(server.handle, requests))
+        elapsed = time.perf_counter() - start
+        assert all(response['ok'] for response in responses)
+        print(f"session requests: {len(requests) / elapsed:,.0f} requests/s")
+        shop.storage.close()
+
+
+def bench_metrics(args):
+    with tempfile.TemporaryDirectory() as directory:
+        shop = make_shop(directory, args.customers, args.products or 1000, args.storage)
+        customers = list(shop.users.values())
+        rng = random.Random(4)
+        orders = [(customers[rng.randrange(len(customers))], [(rng.randint(1, len(shop.products)), 1)])
+                  for _ in range(args.requests)]
+        #every purchase picks off or on at random, so journal compactions and a
+        #growing history hit both alike
+        latencies = {False: [], True: []}
+        for customer, lines in orders:
+            enabled = rng.random() < 0.5
+            shop.metrics.enable() if enabled else shop.metrics.disable()
+            start = time.perf_counter()
+            shop.purchase(customer, lines)
+            latencies[enabled].append(time.perf_counter() - start)
+        for enabled in (False, True):
+            samples = sorted(latencies[enabled])
+            print(f"metrics {'on' if enabled else 'off'}: median {percentile(samples, 0.5) * 1e6:.1f} us, "
+                  f"mean {sum(samples) / len(samples) * 1e6:.1f} us per purchase")
+        print(json.dumps(shop.metrics.to_data()['operations']['purchase'], indent=4))
+        shop.storage.close()
+
+
+def open_dataset(directory, storage):
+    if storage == "sqlite":
+        return OnlineShop(SqliteStorage(os.path.join(directory, "shop.db")))
+    shop = OnlineShop(JsonStorage(os.path.join(directory, "users.json"), os.path.join(directory, "products.json"),
+                                  os.path.join(directory, "transactions.json")))
+    shop.storage.journal.path = os.path.join(directory, "journal.jsonl")
+    return shop
+
+
+def run_phase(phases, name, operations, work):
+    start = time.perf_counter()
+    work()
+    seconds = time.perf_counter() - start
+    phases[name] = {'operations': operations, 'seconds': seconds,
+                    'operations_per_second': operations / seconds if seconds else None}
+    print(f"  {name}: {operations} in {seconds:.3f}s", file=sys.stderr)
+
+
+def run_scale(directory, scale, args):
+    #customers and products grow with the history, one of each per ten purchases
+    customers = max(1, scale // 10)
+    products = max(1, scale // 10)
+    start = time.perf_counter()
+    generate_dataset(directory, customers, 5, products, scale, args.seed, args.storage)
+    generate_seconds = time.perf_counter() - start
+    print(f"scale {scale}: generated in {generate_seconds:.1f}s", file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    shop = open_dataset(directory, args.storage)
+    shop.metrics.enable()
+    phases = {}
+    run_phase(phases, "load", 1, shop.load_data)
+    run_phase(phases, "load_history", 1, shop.load_history)
+
+    usernames = [username for username in shop.users if username.startswith("customer")]
+    logins = [rng.choice(usernames) for _ in range(args.logins)]
+    run_phase(phases, "login", len(logins), lambda: [shop.authenticate(username, "password") for username in logins])
+
+    product_indexes = [rng.randint(1, products) for _ in range(args.operations * 100)]
+    run_phase(phases, "lookup", len(product_indexes),
+              lambda: [shop.find_product_by_index(product_index) for product_index in product_indexes])
+
+    orders = [(shop.users[rng.choice(usernames)], [(rng.randint(1, products), rng.randint(1, 3))
+                                                   for _ in range(rng.randint(1, 3))])
+              for _ in range(args.operations)]
+    rejected = []
+
+    def purchase():
+        for customer, lines in orders:
+            try:
+                shop.purchase(customer, lines)
+            except ShopError:
+                rejected.append(customer.username)
+    run_phase(phases, "purchase", len(orders), purchase)
+    phases['purchase']['rejected'] = len(rejected)
+
+    pages = [rng.randint(1, max(1, products // shop.page_size)) for _ in range(args.operations)]
+    run_phase(phases, "list_products", len(pages), lambda: [shop.list_products(page) for page in pages])
+    #a customer's own history has to be found among all transactions, so fewer of these
+    history_pages = [rng.choice(usernames) for _ in range(max(1, len(pages) // 100))]
+    run_phase(phases, "list_transactions", len(history_pages),
+              lambda: [shop.list_transactions(1, username=username) for username in history_pages])
+    queries = [rng.choice(("pro", "smart phone", "ultra*", "lamp eco", "max kit")) for _ in range(args.operations)]
+    run_phase(phases, "search", len(queries), lambda: [shop.search_products(query) for query in queries])
+
+    run_phase(phases, "save", 1, shop.save_data)
+    if args.storage == "json":
+        #the journal is folded into the json files on a thread, after save_data returned
+        run_phase(phases, "compaction", 1, shop.storage.wait_for_compaction)
+    #what a full snapshot of everything costs, which a compaction no longer does
+    run_phase(phases, "save_full", 1, lambda: shop.storage.save(shop.users, shop.products, shop.history,
+                                                                {'users', 'products', 'transactions'}))
+    result = {
+        'scale': scale,
+        'records': {'users': len(shop.users), 'products': len(shop.products), 'transactions': len(shop.history)},
+        'generate_seconds': generate_seconds,
+        'phases': phases,
+        'metrics': shop.metrics.to_data()['operations'],
+    }
+    shop.storage.close()
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'date': datetime.datetime.now().isoformat(timespec="seconds")}
+
+
+#Drives the OnlineShop service without input() through load, login, lookup, purchase,
+#listing, search and save on generated data of every scale, and writes the
+#results as JSON so runs of different versions can be compared.
+def bench_suite(args):
+    results = {'environment': environment(), 'storage': args.storage, 'seed': args.seed, 'scales': []}
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as directory:
+            results['scales'].append(run_scale(directory, scale, args))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+
+def repeat_store(store, count):
+    #tens of millions of rows built row by row would take minutes, so a
+    #smaller history is repeated column by column instead
+    big = TransactionStore()
+    big.names = store.names
+    big.name_ids = store.name_ids
+    repeats = -(-count // len(store))
+    for column, source in zip(big.columns(), store.columns()):
+        column.extend((source * repeats)[:count])
+    return big
+
+
+def same_totals(first, second):
+    return first.keys() == second.keys() and all(
+        abs(first[key] - second[key]) <= 1e-6 * max(1, abs(first[key])) for key in first)
+
+
+def bench_analytics(args):
+    count = args.history_rows
+    start = time.perf_counter()
+    store = repeat_store(build_store(make_transaction_rows(min(count, 1000000))), count)
+    print(f"{len(store):,} rows built in {time.perf_counter() - start:.1f}s, {os.cpu_count()} cpu(s)")
+
+    expected = {}
+    scan_seconds = {}
+    for query, function in analytics.QUERIES.items():
+        start = time.perf_counter()
+        expected[query] = function(store)
+        scan_seconds[query] = time.perf_counter() - start
+        print(f"single-threaded scan {query}: {scan_seconds[query]:.2f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for by in ("date", "username"):
+            start = time.perf_counter()
+            history = analytics.PartitionedHistory.create(store, os.path.join(directory, by), by, args.partitions)
+            print(f"partitioned by {by} into {len(history.paths)} files in {time.perf_counter() - start:.1f}s")
+            for workers in args.processes or sorted({1, 2, 4, os.cpu_count()}):
+                for query in analytics.QUERIES:
+                    start = time.perf_counter()
+                    result = history.run(query, workers)
+                    seconds = time.perf_counter() - start
+                    if not same_totals(result, expected[query]):
+                        raise RuntimeError(f"{query} by {by} does not match the single-threaded scan")
+                    print(f"  {query} on {workers} process(es): {seconds:.2f}s, "
+                          f"speed-up {scan_seconds[query] / seconds:.2f}x")
+
+
+def bench_pricing(args):
+    products = {product.product_index: product for product in make_products(args.products or 100000)}
+    rng = random.Random(3)
+    count = args.orders
+    product_indexes = [rng.randint(1, len(products)) for _ in range(count)]
+    quantities = [rng.randint(1, 20) for _ in range(count)]
+    levels = [rng.randrange(4) for _ in range(count)]
+
+    start = time.perf_counter()
+    expected = [pricing.price_line(products[product_index].price, quantity, pricing.discount_for(level))
+                for product_index, quantity, level in zip(product_indexes, quantities, levels)]
+    loop_time = time.perf_counter() - start
+    print(f"{count} orders, one at a time: {loop_time:.3f}s")
+
+    batches = {"pure python batch": pricing.price_batch_python}
+    if pricing.numpy is not None:
+        batches["numpy batch"] = pricing.price_batch_numpy
+    for name, price in batches.items():
+        start = time.perf_counter()
+        columns = price(products, product_indexes, quantities, levels)
+        elapsed = time.perf_counter() - start
+        same = all(row == (total_cost, discounted_cost, final_cost) for row, total_cost, discounted_cost, final_cost
+                   in zip(expected, list(columns['total_cost']), list(columns['discounted_cost']),
+                          list(columns['final_cost'])))
+        print(f"{name}: {elapsed:.3f}s ({loop_time / elapsed:.1f}x), identical to one at a time: {same}")
+
+    start = time.perf_counter()
+    pricing.price_batch(products, product_indexes, quantities, levels, cents=True)
+    print(f"batch with exact cents: {time.perf_counter() - start:.3f}s")
+
+
+def bench_catalog(args):
+    count = args.products or 500000
+    with tempfile.TemporaryDirectory() as directory:
+        feed = os.path.join(directory, "feed.csv")
+        with open(feed, "w") as file:
+            file.write("product_index,product_name,price,manufacturer,remarks\n")
+            for product in make_products(count):
+                file.write(f"{product.product_index},{product.product_name},{product.price},"
+                           f"{product.manufacturer},{' '.join(product.remarks)}\n")
+
+        shop = make_shop(directory, 1, 0, args.storage)
+        report = import_products(shop, feed, args.chunk_size)
+        print(f"import {report.rows} rows ({args.storage}, chunks of {args.chunk_size}): "
+              f"{report.seconds:.2f}s, {report.rows_per_second:,.0f} rows/s")
+        for extension in ("csv", "jsonl"):
+            rows, seconds = export_products(shop, os.path.join(directory, "export." + extension))
+            print(f"export {rows} rows to {extension}: {seconds:.2f}s, {rows / seconds:,.0f} rows/s")
+        shop.storage.close()
+
+
+def catalog_reads(rng, count, products):
+    #a few popular pages and searches make up most reads, as in bench_suite
+    reads = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            reads.append(("page", min(50, 1 + int(rng.expovariate(0.3))), {}))
+        elif kind < 0.7:
+            reads.append(("page", 1, {"manufacturer": "maker%d" % min(999, int(rng.expovariate(0.05)))}))
+        else:
+            product = products[min(len(products) - 1, int(rng.expovariate(0.01)))]
+            reads.append(("search", product.product_name.split()[0], None))
+    return reads
+
+
+def bench_catalog_cache(args):
+    with tempfile.TemporaryDirectory() as directory:
+        shop = make_shop(directory, 1, args.products or 100000, args.storage)
+        cli = ShopCLI(shop)
+        rng = random.Random(args.seed)
+        products = list(shop.products.values())
+        reads = catalog_reads(rng, args.operations, products)
+        #max_entries=0 keeps nothing, so every read formats and scans again
+        for name, max_entries in (("no cache", 0), ("cache", 1000)):
+            shop.catalog_cache.max_entries = max_entries
+            shop.catalog_cache.clear()
+            shop.catalog_cache.reset_stats()
+            latencies = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for number, (kind, argument, filters) in enumerate(reads, 1):
+                    read_start = time.perf_counter()
+                    if kind == "page":
+                        cli.read_products(argument, **filters)
+                    else:
+                        cli.read_search(argument)
+                    latencies.append(time.perf_counter() - read_start)
+                    if args.write_every and number % args.write_every == 0:
+                        product = products[rng.randrange(len(products))]
+                        shop.update_product(product.product_index, product.product_name, product.price,
+                                            product.manufacturer, product.remarks)
+            #the product updates are left out of the timings
+            report_latencies(name, latencies, sum(latencies))
+            print(f"    {shop.catalog_cache.stats()}")
+        shop.storage.close()
+
+
+#purchases of one unit each: "spread" picks any product, "hot" always the
+#same one and "mixed" the hot one half of the time
+STOCK_SCENARIOS = {
+    "spread": 0.0,
+    "mixed": 0.5,
+    "hot": 1.0,
+}
+
+
+def stock_buyer(shop, customer, rng, hot_share, products, count, counts):
+    for _ in range(count):
+        product_index = 1 if rng.random() < hot_share else rng.randint(1, products)
+        try:
+            shop.purchase(customer, [(product_index, 1)])
+            counts['ok'] += 1
+        except ShopError:
+            counts['rejected'] += 1
+
+
+def bench_stock(args):
+    products = args.products or 1000
+    for name, hot_share in STOCK_SCENARIOS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            shop = make_shop(directory, args.clients, products, args.storage)
+            #the hot product sells out part way through, every other one never does
+            shop.products[1].stock = args.hot_stock
+            stock_before = {product_index: product.stock for product_index, product in shop.products.items()}
+            customers = list(shop.users.values())
+            counts = [{'ok': 0, 'rejected': 0} for _ in customers]
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as pool:
+                list(pool.map(lambda number: stock_buyer(shop, customers[number], random.Random(number), hot_share,
+                                                         products, args.requests, counts[number]),
+                              range(args.clients)))
+            elapsed = time.perf_counter() - start
+
+            #every unit sold has to be gone from the shelf, and no more than was there
+            sold = {}
+            for product_index, quantity in zip(shop.transactions.product_indexes, shop.transactions.quantities):
+                sold[product_index] = sold.get(product_index, 0) + quantity
+            for product_index, product in shop.products.items():
+                if product.stock < 0 or stock_before[product_index] - product.stock != sold.get(product_index, 0):
+                    raise RuntimeError(f"stock of product {product_index} does not add up")
+            if shop.inventory.reserved:
+                raise RuntimeError(f"reservations left behind: {shop.inventory.reserved}")
+
+            ok = sum(count['ok'] for count in counts)
+            rejected = sum(count['rejected'] for count in counts)
+            print(f"{name:>6} ({args.clients} buyers, {args.storage}): {(ok + rejected) / elapsed:,.0f} checkouts/s, "
+                  f"{ok} sold, {rejected} out of stock, hot product {shop.products[1].stock} left")
+            shop.storage.close()
+
+    #reserve and commit on their own, without the purchase around them
+    for name, hot_share in STOCK_SCENARIOS.items():
+        shop = OnlineShop()
+        for product in make_products(products):
+            shop.products[product.product_index] = product
+        inventory = shop.inventory
+
+        def reserver(number):
+            rng = random.Random(number)
+            for _ in range(args.requests * 10):
+                product_index = 1 if rng.random() < hot_share else rng.randint(1, products)
+                inventory.commit(inventory.reserve([(shop.products[product_index], 1)]))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            list(pool.map(reserver, range(args.clients)))
+        elapsed = time.perf_counter() - start
+        print(f"{name:>6} reserve+commit only: {args.clients * args.requests * 10 / elapsed:,.0f} per second")
+
+
+def startup_imports_only(shop):
+    pass
+
+
+def startup_json_load(shop):
+    #what load_data did before the history was loaded lazily
+    with open("users.json") as file:
+        shop.users = {row['username']: user_from_data(row) for row in json.load(file)}
+    with open("products.json") as file:
+        shop.products = {row['product_index']: product_from_data(row) for row in json.load(file)}
+    with open("transactions.json") as file:
+        shop.history = TransactionStore(Transaction(**row) for row in json.load(file))
+    shop.search_index.rebuild(shop.products.values())
+    shop.sales.rebuild(shop.history)
+
+
+def startup_streaming(shop):
+    shop.load_data()
+
+
+def startup_streaming_history(shop):
+    shop.load_data()
+    shop.load_history()
+
+
+def startup_binary_snapshot(shop):
+    shop.storage.binary_snapshot = True
+    shop.load_data()
+    shop.load_history()
+
+
+STARTUP_MODES = {
+    "imports only": startup_imports_only,
+    "json.load everything": startup_json_load,
+    "streaming, menu ready": startup_streaming,
+    "streaming + history": startup_streaming_history,
+    "binary snapshot + history": startup_binary_snapshot,
+}
+
+
+def measure_startup(mode):
+    #runs in a fresh interpreter so every mode starts from the same memory
+    start = time.perf_counter()
+    shop = OnlineShop(JsonStorage())
+    STARTUP_MODES[mode](shop)
+    seconds = time.perf_counter() - start
+    #VmHWM starts again at exec, unlike ru_maxrss which keeps the parent's peak
+    with open("/proc/self/status") as file:
+        peak = next(int(line.split()[1]) for line in file if line.startswith("VmHWM:"))
+    print(json.dumps([seconds, peak * 1024]))
+
+
+def bench_startup(args):
+    count = args.orders
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        password_hash = PasswordHasher().hash("password")
+        customers = [Customer("customer%d" % number, password_hash, "customer %d" % number, number % 4, 1000000.0)
+                     for number in range(10000)]
+        write_json(os.path.join(directory, "users.json"), [user_to_data(customer) for customer in customers])
+        write_json(os.path.join(directory, "products.json"),
+                   [product_to_data(product) for product in make_products(args.products or 100000)])
+        transactions_path = os.path.join(directory, "transactions.json")
+        write_json(transactions_path, [transaction_to_data(Transaction(*row)) for row in make_transaction_rows(count)])
+        print(f"transactions.json: {count} rows, {os.path.getsize(transactions_path) / 2 ** 20:.0f} MiB")
+
+        #the first binary snapshot run writes transactions.json.bin, the timed runs read it
+        for run, name in enumerate(["binary snapshot + history"] + list(STARTUP_MODES)):
+            output = subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {here!r}); "
+                                     f"from benchmark import measure_startup; measure_startup({name!r})"],
+                                    cwd=directory, check=True, capture_output=True, text=True).stdout
+            seconds, peak = json.loads(output)
+            if run:
+                print(f"{name}: {seconds:.2f}s, peak RSS {peak / 2 ** 20:.0f} MiB")
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "memory": bench_memory,
+    "server": bench_server,
+    "pricing": bench_pricing,
+    "catalog": bench_catalog,
+    "startup": bench_startup,
+    "login": bench_login,
+    "metrics": bench_metrics,
+    "suite": bench_suite,
+    "analytics": bench_analytics,
+    "catalog_cache": bench_catalog_cache,
+    "stock": bench_stock,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online Shopping benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--object-rows", type=int, default=1000000)
+    parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--customers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--login-workers", type=int)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="transactions in each generated dataset (suite)")
+    parser.add_argument("--operations", type=int, default=1000, help="purchases, pages and searches per scale (suite)")
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--history-rows", type=int, default=20000000)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--processes", type=int, nargs="+", help="pool sizes to compare (analytics)")
+    parser.add_argument("--hot-stock", type=int, default=1000, help="units of the hot product (stock)")
+    parser.add_argument("--write-every", type=int, default=200,
+                        help="update a product after this many reads, 0 for none (catalog_cache)")
+    parser.add_argument("--output", help="file for the suite results, printed when not given")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
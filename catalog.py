@@ -0,0 +1,131 @@
+import csv
+import json
+import math
+import time
+from product import Product
+
+FIELDS = ['product_index', 'product_name', 'price', 'manufacturer', 'remarks', 'stock']
+
+
+class ImportReport:
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.rejected = []
+        self.seconds = 0
+
+    @property
+    def rows(self):
+        return self.added + self.updated + len(self.rejected)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+
+def read_rows(path):
+    with open(path, "r", newline="") as file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                #csv has no lists, remarks are space separated like in the menu
+                row['remarks'] = (row.get('remarks') or "").split()
+                yield row
+        else:
+            for line in file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        #reported as an invalid row by import_products
+                        yield None
+
+
+def whole_number(value, name):
+    #int() would quietly turn 1.5 or true from a JSON row into 1
+    if isinstance(value, (bool, float)):
+        raise ValueError(f"{name} must be a whole number")
+    return int(value)
+
+
+def product_from_row(row):
+    product_index = whole_number(row['product_index'], "product index")
+    if isinstance(row['price'], bool):
+        raise ValueError("price must be a number")
+    price = float(row['price'])
+    #float() accepts "nan" and "inf", which no comparison would catch later
+    if not math.isfinite(price):
+        raise ValueError("price must be a finite number")
+    if price < 0:
+        raise ValueError("price cannot be negative")
+    #a feed without stock leaves the stock of existing products alone, new
+    #products from it are not tracked
+    stock = row.get('stock')
+    if stock in (None, ""):
+        stock = None
+    else:
+        stock = whole_number(stock, "stock")
+        if stock < 0:
+            raise ValueError("stock cannot be negative")
+    return Product(product_index, str(row['product_name']), price, str(row['manufacturer']),
+                   tuple(str(remark) for remark in row.get('remarks') or ()), stock)
+
+
+#Streams a supplier feed (.csv with a header row, or JSON Lines) into the
+#shop. Rows are upserted and saved chunk_size at a time, so memory and the
+#number of saves depend on the chunk size and not on the size of the feed.
+def import_products(shop, path, chunk_size=50000):
+    report = ImportReport()
+    start = time.perf_counter()
+    seen = set()
+    chunk = []
+    for row_number, row in enumerate(read_rows(path), 1):
+        try:
+            product = product_from_row(row)
+        except (KeyError, TypeError, ValueError) as error:
+            report.rejected.append((row_number, f"invalid row: {error}"))
+            continue
+        #product index must be unique within one feed as well
+        if product.product_index in seen:
+            report.rejected.append((row_number, f"duplicate product index {product.product_index}"))
+            continue
+        seen.add(product.product_index)
+
+        if product.product_index in shop.products:
+            report.updated += 1
+        else:
+            report.added += 1
+        chunk.append(product)
+        if len(chunk) >= chunk_size:
+            shop.upsert_products(chunk)
+            chunk = []
+
+    if chunk:
+        shop.upsert_products(chunk)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def export_products(shop, path):
+    start = time.perf_counter()
+    rows = 0
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.writer(file)
+            writer.writerow(FIELDS)
+            for product in shop.products.values():
+                writer.writerow((product.product_index, product.product_name, product.price,
+                                 product.manufacturer, " ".join(product.remarks), product.stock))
+                rows += 1
+        else:
+            for product in shop.products.values():
+                file.write(json.dumps({
+                    'product_index': product.product_index,
+                    'product_name': product.product_name,
+                    'price': product.price,
+                    'manufacturer': product.manufacturer,
+                    'remarks': list(product.remarks),
+                    'stock': product.stock
+                }) + "\n")
+                rows += 1
+    seconds = time.perf_counter() - start
+    return rows, seconds
@@ -0,0 +1,599 @@
+import sys
+from Admin import Admin
+from Customer import Customer
+from shop import ShopError
+from catalog import export_products, import_products
+
+
+#The console front end. It asks for input, calls the OnlineShop service
+#and prints the outcome; the logged in user is kept here and not in the shop.
+class ShopCLI:
+    def __init__(self, shop):
+        self.shop = shop
+        self.logged_in_user = None
+
+    def register(self):
+        username = input("Enter username: ")
+        if self.shop.is_username_taken(username):
+            print("Username already exists.")
+            return
+
+        password = input("Enter password (at least 6 characters): ")
+        if len(password) < 6:
+            print("Password must be at least 6 characters.")
+            return
+
+        role = input("Enter role (admin/customer): ")
+        if role.lower() not in ['admin', 'customer']:
+            print("Invalid role.")
+            return
+
+        name = input("Enter name: ")
+        budget = 0.0
+        if role.lower() == 'customer':
+            budget = float(input("Enter budget: "))
+
+        try:
+            self.shop.register_user(username, password, role, name, budget)
+        except ShopError as error:
+            print(error)
+            return
+        print("Registration successful.")
+
+    def login(self):
+        username = input("Enter username: ")
+        password = input("Enter password: ")
+
+        try:
+            user = self.shop.authenticate(username, password)
+        except ShopError as error:
+            print(error)
+            return
+
+        self.logged_in_user = user
+        print(f"Logged in as {user.username} ({user.role}).")
+
+    def logout(self):
+        self.logged_in_user = None
+        print("Logged out.")
+
+    def add_product(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        product_index =int(input("Enter product index(in integer): "))
+        if product_index in self.shop.products:
+            print("product index must be unique and cannot be repeated")
+            return
+
+        product_name = input("Enter product name: ")
+        price = float(input("Enter price: "))
+        manufacturer = input("Enter manufacturer: ")
+        remarks = str(input("Enter remarks: "))
+        stock = int(input("Enter quantity in stock: "))
+
+        try:
+            self.shop.add_product(product_index, product_name, price, manufacturer, remarks.split(), stock)
+        except ShopError as error:
+            print(error)
+            return
+        print("Product added successfully.")
+
+    def import_catalog(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        path = input("Enter file to import (.csv or .jsonl): ")
+        try:
+            report = import_products(self.shop, path)
+        except FileNotFoundError:
+            print("File not found.")
+            return
+
+        print(f"{report.added} product(s) added, {report.updated} updated, {len(report.rejected)} rejected "
+              f"in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s).")
+        for row_number, reason in report.rejected[:10]:
+            print(f"row {row_number}: {reason}")
+
+    def export_catalog(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        path = input("Enter file to export to (.csv or .jsonl): ")
+        rows, seconds = export_products(self.shop, path)
+        print(f"{rows} product(s) exported in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s).")
+
+    def remove_product(self, *args):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        if not args:
+            print("No product indices provided.")
+            return
+
+        removed_count = self.shop.remove_products(int(product_index) for product_index in args)
+
+        if removed_count > 0:
+            print(f"{removed_count} product(s) removed successfully.")
+        else:
+            print("No matching products found.")
+
+    def restock_product(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        product_index = int(input("Enter product index to restock: "))
+        try:
+            print("Available:", self.stock_text(self.shop.available_stock(product_index)))
+            quantity = int(input("Enter quantity to add: "))
+            stock = self.shop.restock(product_index, quantity)
+        except ShopError as error:
+            print(error)
+            return
+        print("Product restocked, in stock:", stock)
+
+    def stock_text(self, available):
+        return "not tracked" if available is None else available
+
+    def update_product(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        product_index = int(input("Enter product index to update: "))
+        product = self.shop.find_product_by_index(product_index)
+        if product is None:
+            print("Product not found.")
+            return
+
+        product_name = input("Enter new product name: ")
+        price = float(input("Enter new price: "))
+        manufacturer = input("Enter new manufacturer: ")
+        R = str(input("Enter new remarks: "))
+        self.shop.update_product(product_index, product_name, price, manufacturer, R.split())
+        print("Product updated successfully.")
+
+    #returns whether there is a next page and the product_index it starts behind
+    def read_products(self, page=1, after=None, **filters):
+        #the page is formatted once and printed from the cache until the catalog changes
+        key = ('rendered products', self.shop.page_size, page, after, tuple(sorted(filters.items())))
+        text, has_next, last = self.shop.catalog_cache.get(key, lambda: self.render_products(page, after, filters))
+        sys.stdout.write(text)
+        return has_next, last
+
+    def render_products(self, page, after, filters):
+        products, has_next = self.shop.list_products(page, after, **filters)
+        lines = [f"Product Listing (page {page}):\n"]
+        for product in products:
+            lines.append(self.product_line(product))
+        return "".join(lines), has_next, products[-1].product_index if products else after
+
+    def product_line(self, product):
+        x=" ".join(product.remarks)
+        return (f"Index: {product.product_index}, Name: {product.product_name}, "
+                f"Price: ${product.price}, Manufacturer: {product.manufacturer}, "
+                f"Remarks: {x}\n\n")
+
+    def read_search(self, query=None):
+        if query is None:
+            query = input("Search for (end a word with * to match its beginning): ")
+        text = self.shop.catalog_cache.get(('rendered search', self.shop.page_size, query),
+                                           lambda: self.render_search(query))
+        sys.stdout.write(text)
+
+    def render_search(self, query):
+        products = self.shop.search_products(query, self.shop.page_size)
+        if not products:
+            return "No matching products found.\n"
+        lines = ["Search results:\n"]
+        for product in products:
+            lines.append(self.product_line(product))
+        return "".join(lines)
+
+    #transactions are paged by number, there is no cursor to return
+    def read_transaction(self, page=1, after=None, **filters):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return False, None
+        try:
+            transactions, has_next = self.shop.list_transactions(page, **filters)
+        except ShopError as error:
+            print(error)
+            return False, None
+        lines = [f"transaction history (page {page}):\n"]
+        for transaction in transactions:
+            y = " ".join(transaction.date)
+            lines.append(f"Customer username: {transaction.username},Product index: {transaction.product_index},"
+                         f"quantity:{transaction.quantity},total cost:{transaction.total_cost},"
+                         f"discount:{transaction.discount},discounted cost:{transaction.discounted_cost},"
+                         f"final cost: {transaction.final_cost},date: {y}\n\n")
+        sys.stdout.write("".join(lines))
+        return has_next, None
+
+    def browse(self, read_page, ask_filters):
+        page = 1
+        #cursors[page - 1] is what read_page returned for the page before, so
+        #the next page is read on from there instead of counted from the start
+        cursors = [None]
+        filters = {}
+        while True:
+            has_next, cursor = read_page(page, cursors[page - 1], **filters)
+            choice = input("n. next page, p. previous page, f. filter, q. back: ")
+            if choice == "n" and has_next:
+                del cursors[page:]
+                cursors.append(cursor)
+                page += 1
+            elif choice == "p" and page > 1:
+                page -= 1
+            elif choice == "f":
+                filters = ask_filters()
+                page = 1
+                cursors = [None]
+            elif choice == "q":
+                return
+            else:
+                print("No such page.")
+
+    def ask_product_filters(self):
+        filters = {}
+        manufacturer = input("Manufacturer (blank for any): ")
+        if manufacturer:
+            filters['manufacturer'] = manufacturer
+        min_price = input("Minimum price (blank for any): ")
+        if min_price:
+            filters['min_price'] = float(min_price)
+        max_price = input("Maximum price (blank for any): ")
+        if max_price:
+            filters['max_price'] = float(max_price)
+        keyword = input("Remark keyword (blank for any): ")
+        if keyword:
+            filters['keyword'] = keyword
+        return filters
+
+    def ask_transaction_filters(self):
+        filters = {}
+        username = input("Customer username (blank for all): ")
+        if username:
+            filters['username'] = username
+        start_date = input("From date YYYY-MM-DD (blank for any): ")
+        if start_date:
+            filters['start_date'] = start_date
+        end_date = input("To date YYYY-MM-DD (blank for any): ")
+        if end_date:
+            filters['end_date'] = end_date
+        return filters
+
+    def read_sales_report(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        sales = self.shop.sales_report()
+        print("1. Revenue by product")
+        print("2. Revenue by customer")
+        print("3. Total discount given")
+        print("4. Daily sales")
+        x = input("Please choose a report: ")
+        if x == "1":
+            print("Top products by revenue:")
+            for product_index, quantity, revenue in sales.top_products(self.shop.page_size):
+                print(f"Product index: {product_index}, quantity sold: {quantity}, revenue: {revenue}")
+        elif x == "2":
+            print("Top customers by revenue:")
+            for username, purchases, revenue in sales.top_customers(self.shop.page_size):
+                print(f"Customer username: {username}, purchases: {purchases}, revenue: {revenue}")
+        elif x == "3":
+            print("Transactions:",sales.transaction_count)
+            print("Total revenue:",sales.total_revenue)
+            print("Total discount given:",sales.total_discount)
+        elif x == "4":
+            print("Daily sales:")
+            for day, purchases, revenue in sales.daily_sales():
+                print(f"Date: {day}, purchases: {purchases}, revenue: {revenue}")
+        else:
+            print("invalid input")
+
+    def read_metrics(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        data = self.shop.metrics.to_data()
+        print("Metrics are", "on" if data['enabled'] else "off")
+        for name, operation in data['operations'].items():
+            print(f"{name}: {operation['count']} calls, {operation['errors']} errors, "
+                  f"p50 {operation['p50_ms']:.3f} ms, p95 {operation['p95_ms']:.3f} ms, p99 {operation['p99_ms']:.3f} ms")
+        print(f"Saves: {data['saves']['count']}, bytes written: {data['saves']['bytes_total']} "
+              f"(largest {data['saves']['bytes_max']})")
+        print("Records:", ", ".join(f"{name} {count}" for name, count in data['records'].items()))
+        cache = data['catalog_cache']
+        print(f"Catalog cache: {cache['entries']} entries, {cache['hits']} hits, {cache['misses']} misses "
+              f"({cache['hit_rate']:.1%} hit rate), {cache['invalidations']} invalidations")
+
+        print("1. Turn metrics", "off" if data['enabled'] else "on")
+        print("2. Save metrics as JSON")
+        print("3. Profile the next call of an operation")
+        print("4. Show captured profiles")
+        print("5. Reset metrics")
+        x = input("Please choose an option (blank to go back): ")
+        if x == "1":
+            if data['enabled']:
+                self.shop.metrics.disable()
+            else:
+                self.shop.metrics.enable()
+        elif x == "2":
+            path = input("Enter file to save to: ")
+            self.shop.metrics.dump(path)
+            print("Metrics saved to", path)
+        elif x == "3":
+            name = input("Enter operation (e.g. save_data, purchase, list_products): ")
+            try:
+                self.shop.metrics.profile(name)
+            except ValueError as error:
+                print(error)
+                return
+            #profiling goes through the same wrappers as the timings
+            self.shop.metrics.enable()
+            print(f"The next call of {name} will be profiled.")
+        elif x == "4":
+            for name, profile in self.shop.metrics.profiles.items():
+                print(f"-------- {name} --------")
+                print(profile)
+        elif x == "5":
+            self.shop.metrics.reset()
+
+    def read_customer(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be an admin to perform this action.")
+            return
+
+        print("User Listing:")
+        for user in self.shop.list_customers():
+            print(f"Username: {user.username}, Role: {user.role},Name: {user.name},Membership Level: {user.membership_level}, Budget: {user.budget}")
+
+    def make_transaction(self):
+        if not isinstance(self.logged_in_user, Customer):
+            print("You must be a customer to perform this action.")
+            return
+
+        self.read_products()
+        print("Budget:",self.logged_in_user.budget)
+        product_index = int(input("Enter product index to purchase: "))
+        product = self.shop.find_product_by_index(product_index)
+        if product is None:
+            print("Product not found.")
+            return
+
+        print("In stock:", self.stock_text(self.shop.available_stock(product_index)))
+        quantity = int(input("Enter quantity to purchase: "))
+        transactions = self.checkout([(product_index, quantity)])
+        if transactions is None:
+            return
+
+        transaction = transactions[0]
+        print("Transaction successful.")
+        print("Product brought: index:",product_index)
+        print("Quantity:",quantity)
+        print("Total cost:",transaction.total_cost)
+        print("Discount%:",100*transaction.discount)
+        print("Discounted cost:", transaction.discounted_cost)
+        print("Final price: ",transaction.final_cost)
+        print("Remaining budget:",self.logged_in_user.budget)
+
+    def checkout(self, lines):
+        if not isinstance(self.logged_in_user, Customer):
+            print("You must be a customer to perform this action.")
+            return None
+
+        try:
+            return self.shop.purchase(self.logged_in_user, lines)
+        except ShopError as error:
+            print(error)
+            return None
+
+    def cart_checkout(self):
+        if not isinstance(self.logged_in_user, Customer):
+            print("You must be a customer to perform this action.")
+            return
+
+        self.read_products()
+        print("Budget:",self.logged_in_user.budget)
+        lines = []
+        while True:
+            product_index = input("Enter product index to add to the cart (blank to check out): ")
+            if not product_index:
+                break
+            quantity = int(input("Enter quantity to purchase: "))
+            lines.append((int(product_index), quantity))
+
+        transactions = self.checkout(lines)
+        if transactions is None:
+            return
+
+        print("Transaction successful.")
+        for transaction in transactions:
+            print("Product brought: index:",transaction.product_index,"quantity:",transaction.quantity,
+                  "final price:",transaction.final_cost)
+        print("Total final price:",sum(transaction.final_cost for transaction in transactions))
+        print("Remaining budget:",self.logged_in_user.budget)
+
+    def add_money(self):
+        if not isinstance(self.logged_in_user, Customer):
+            print("You must be a customer to perform this action.")
+            return
+
+        amount = float(input("Enter the amount to add: "))
+
+        try:
+            budget = self.shop.deposit(self.logged_in_user, amount)
+        except ShopError as error:
+            print(error)
+            return
+
+        print("remaining budget:",budget)
+        print("Money added successfully.")
+
+    def membership_cost_change(self):
+        if not isinstance(self.logged_in_user, Admin):
+            print("You must be a admin to perform this action.")
+            return
+        print("Membership level increase at 1 level at a time")
+        print("increase membership level from 0 to 1 cost",self.shop.level_cost.get(1)," dollars")
+        print("increase membership level from 1 to 2 cost",self.shop.level_cost.get(2)," dollars")
+        print("increase membership level from 2 to 3 cost",self.shop.level_cost.get(3)," dollars")
+        print("Please input which membership level cost you would change:\n","1. level 0 to 1\n","2. level 1 to 2\n","3. level 2 to 3\n")
+        x = int(input("Please enter the amount of cost you wish to change: "))
+        if(x == 1 or x==2 or x==3):
+            n_cost= int(input("Please enter the amount of payment: "))
+        else:
+            print("invalid input")
+            return
+        self.shop.set_membership_cost(x, n_cost)
+        print("membership level from",x-1,"to",x,"cost",self.shop.level_cost.get(1)," dollars")
+
+    def increase_membership_level(self):
+        if not isinstance(self.logged_in_user, Customer):
+            print("You must be a customer to perform this action.")
+            return
+
+        try:
+            next_level, cost = self.shop.membership_upgrade(self.logged_in_user)
+        except ShopError as error:
+            print(error)
+            return
+
+        if self.logged_in_user.membership_level == 0:
+            print("membership level 1 cost",self.shop.level_cost.get(1)," dollars and will have 5% discount upon any transaction")
+        elif self.logged_in_user.membership_level == 1:
+            print("membership level 2 cost ",self.shop.level_cost.get(2)," dollars and will have 10% discount upon any transaction")
+        elif self.logged_in_user.membership_level == 2:
+            print("membership level 3 cost ",self.shop.level_cost.get(3)," dollars and will have 15% discount upon any transaction")
+        else:
+            return
+        x = str(input("do you want to increase your membership level?(y/n)"))
+        if(x=="Y" or x=="y"):
+            try:
+                next_level = self.shop.upgrade_membership(self.logged_in_user)
+            except ShopError as error:
+                print(error)
+                return
+            print(f"Membership level increased to {next_level}.")
+            print("remaining budget:",self.logged_in_user.budget)
+        elif (x=="n" or x == "N"):
+            print("membership level was not increase")
+            return
+        else:
+            print("invalid input")
+
+    def show_menu(self,**menu):
+        for x,y in menu.items():
+            print("{}. {}\n".format(y,x))
+
+    def run(self):
+        self.shop.load_data()
+
+        while True:
+            print("\n-------- Online Shopping --------")
+            self.show_menu(Register=1,Login=2,Exit=3)
+            choice = input("Enter your choice: ")
+
+            if choice == "1":
+                self.register()
+            elif choice == "2":
+                self.login()
+                if self.logged_in_user is not None:
+                    if self.logged_in_user.role == 'admin':
+                        while True:
+                            print("\n-------- Admin Menu --------")
+                            print("1. Read all customer data")
+                            print("2. Add product")
+                            print("3. Remove product")
+                            print("4. Update product")
+                            print("5. Read product listing")
+                            print("6. Read transaction history")
+                            print("7. Change cost of membership")
+                            print("8. Sales reports")
+                            print("9. Import products from file")
+                            print("10. Export products to file")
+                            print("11. Restock product")
+                            print("12. Metrics")
+                            print("13. Logout")
+
+                            admin_choice = input("Enter your choice: ")
+
+                            if admin_choice == "1":
+                                self.read_customer()
+                            elif admin_choice == "2":
+                                self.add_product()
+                            elif admin_choice == "3":
+                                self.read_products()
+                                product_indexes = input("Please enter product indexes you want to delete (separated by spaces): ")
+                                self.remove_product(*product_indexes.split())
+                            elif admin_choice == "4":
+                                self.read_products()
+                                self.update_product()
+                            elif admin_choice == "5":
+                                self.browse(self.read_products, self.ask_product_filters)
+                            elif admin_choice == "6":
+                                self.browse(self.read_transaction, self.ask_transaction_filters)
+                            elif admin_choice == "7":
+                                self.membership_cost_change()
+                            elif admin_choice == "8":
+                                self.read_sales_report()
+                            elif admin_choice == "9":
+                                self.import_catalog()
+                            elif admin_choice == "10":
+                                self.export_catalog()
+                            elif admin_choice == "11":
+                                self.restock_product()
+                            elif admin_choice == "12":
+                                self.read_metrics()
+                            elif admin_choice == "13":
+                                self.logout()
+                                break
+                            else:
+                                print("Invalid choice.")
+                    elif self.logged_in_user.role == 'customer':
+                        while True:
+                            print("\n-------- Customer Menu --------")
+                            print("Membership level:",self.logged_in_user.membership_level)
+                            print("remaining budget:",self.logged_in_user.budget)
+                            print("1. Increase membership level")
+                            print("2. Make transaction")
+                            print("3. Read product listing")
+                            print("4. Add money to budget")
+                            print("5. Search products")
+                            print("6. Buy several products at once")
+                            print("7. Logout")
+
+                            customer_choice = input("Enter your choice: ")
+
+                            if customer_choice == "1":
+                                self.increase_membership_level()
+                            elif customer_choice == "2":
+                                self.make_transaction()
+                            elif customer_choice == "3":
+                                self.browse(self.read_products, self.ask_product_filters)
+                            elif customer_choice == "4":
+                                self.add_money()
+                            elif customer_choice == "5":
+                                self.read_search()
+                            elif customer_choice == "6":
+                                self.cart_checkout()
+                            elif customer_choice == "7":
+                                self.logout()
+                                break
+                            else:
+                                print("Invalid choice.")
+            elif choice == "3":
+                self.shop.save_data()
+                self.shop.storage.close()
+                print("Thank you for using our Online Shopping system.")
+                break
+            else:
+                print("Invalid choice.")
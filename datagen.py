@@ -0,0 +1,140 @@
+import argparse
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+from Admin import Admin
+from Customer import Customer
+from product import Product
+from transaction import Transaction
+from auth import PasswordHasher
+from journal import Journal
+from pricing import DISCOUNTS, price_line
+from storage import SqliteStorage, product_to_data, transaction_to_data, user_to_data
+
+START = datetime.datetime(2023, 1, 1)
+WORDS = ["alpha", "bravo", "cable", "delta", "eco", "flex", "giga", "home", "ion", "jet", "kit", "lite", "max",
+         "nano", "omni", "pro", "quad", "retro", "smart", "turbo", "ultra", "vivo", "wave", "xtra", "yoga", "zen"]
+KINDS = ["phone", "laptop", "charger", "headset", "mouse", "keyboard", "monitor", "speaker", "camera", "watch",
+         "tablet", "router", "lamp", "kettle", "blender", "chair", "desk", "bag", "bottle", "shoes"]
+REMARKS = ["new", "sale", "bestseller", "limited", "refurbished", "eco", "bundle", "imported", "warranty", "gift"]
+
+
+def zipf_weights(count, exponent=1.1):
+    #a few customers and products account for most purchases, as in real shops
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def generate_users(rng, customers, admins, password_hash):
+    for number in range(admins):
+        yield Admin("admin%d" % number, password_hash, "Admin %d" % number)
+    for number in range(customers):
+        #most customers never upgrade, few reach the top level
+        level = rng.choices((0, 1, 2, 3), weights=(60, 25, 10, 5))[0]
+        budget = round(rng.lognormvariate(7, 1.5), 2)
+        yield Customer("customer%d" % number, password_hash, "Customer %d" % number, level, budget)
+
+
+def generate_products(rng, count, seed=1):
+    #stock comes from its own generator, so the rest of a dataset stays the
+    #same as before stock was tracked
+    stock_rng = random.Random(seed)
+    manufacturers = ["maker%d" % number for number in range(max(1, count // 50))]
+    manufacturer_weights = zipf_weights(len(manufacturers))
+    for product_index in range(1, count + 1):
+        name = "%s %s %s" % (rng.choice(WORDS), rng.choice(KINDS), rng.choice(WORDS))
+        price = max(0.5, round(rng.lognormvariate(3, 1), 2))
+        manufacturer = rng.choices(manufacturers, cum_weights=manufacturer_weights)[0]
+        #a few products are sold out
+        stock = 0 if stock_rng.random() < 0.02 else int(stock_rng.lognormvariate(6, 1))
+        yield Product(product_index, name, price, manufacturer, rng.sample(REMARKS, rng.randint(1, 3)), stock)
+
+
+def generate_transactions(rng, count, customers, products, days=730):
+    #customers and products are shuffled before ranking, so the popular
+    #ones are not simply the first numbers
+    customers = list(customers)
+    products = list(products)
+    rng.shuffle(customers)
+    rng.shuffle(products)
+    buyers = rng.choices(customers, cum_weights=zipf_weights(len(customers), 0.8), k=count)
+    bought = rng.choices(products, cum_weights=zipf_weights(len(products)), k=count)
+    #the history is append only, so purchases come in date order
+    seconds = sorted(rng.randrange(days * 86400) for _ in range(count))
+
+    for customer, product, second in zip(buyers, bought, seconds):
+        #mostly one item, sometimes a handful
+        quantity = min(20, 1 + int(-math.log(1 - rng.random()) * 0.7))
+        discount = DISCOUNTS[customer.membership_level]
+        total_cost, discounted_cost, final_cost = price_line(product.price, quantity, discount)
+        date = (START + datetime.timedelta(seconds=second)).isoformat(" ").split()
+        yield Transaction(customer.username, product.product_index, quantity, total_cost, discount,
+                          discounted_cost, final_cost, date)
+
+
+def write_json_rows(path, rows):
+    #same layout as json.dump(rows, indent=4), without the whole list in memory
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write("[")
+        separator = "\n"
+        for row in rows:
+            file.write(separator + "    " + json.dumps(row, indent=4).replace("\n", "\n    "))
+            separator = ",\n"
+        file.write("\n]" if separator == ",\n" else "]")
+    os.replace(temp_path, path)
+
+
+#Writes a synthetic shop into directory: users.json, products.json and
+#transactions.json, or shop.db when storage is "sqlite". The same seed gives
+#the same data. Every account has the password "password"; the hash is
+#computed once and shared, hashing every account separately would take minutes.
+def generate_dataset(directory, customers=1000, admins=5, products=1000, transactions=10000, seed=1,
+                     storage="json", days=730):
+    rng = random.Random(seed)
+    password_hash = PasswordHasher().hash("password")
+    users = list(generate_users(rng, customers, admins, password_hash))
+    catalog = list(generate_products(rng, products, seed))
+    buyers = [user for user in users if isinstance(user, Customer)]
+    purchases = generate_transactions(rng, transactions, buyers, catalog, days) if buyers and catalog else ()
+
+    os.makedirs(directory, exist_ok=True)
+    if storage == "sqlite":
+        sqlite_storage = SqliteStorage(os.path.join(directory, "shop.db"))
+        with sqlite_storage.connection:
+            sqlite_storage.connection.execute("DELETE FROM users")
+            sqlite_storage.connection.execute("DELETE FROM products")
+            sqlite_storage.connection.execute("DELETE FROM transactions")
+            sqlite_storage.insert_users(users)
+            sqlite_storage.insert_products(catalog)
+            sqlite_storage.insert_transactions(purchases)
+        sqlite_storage.close()
+    else:
+        write_json_rows(os.path.join(directory, "users.json"), (user_to_data(user) for user in users))
+        write_json_rows(os.path.join(directory, "products.json"), (product_to_data(product) for product in catalog))
+        write_json_rows(os.path.join(directory, "transactions.json"),
+                        (transaction_to_data(transaction) for transaction in purchases))
+        #a journal left over from an earlier dataset would be replayed onto this one,
+        #the new one only records how many transactions there are
+        journal = Journal(os.path.join(directory, "journal.jsonl"))
+        journal.reset(transactions if buyers and catalog else 0)
+        journal.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Online Shopping dataset")
+    parser.add_argument("directory")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=730, help="the transactions are spread over this many days")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+    generate_dataset(args.directory, args.customers, args.admins, args.products, args.transactions, args.seed,
+                     args.storage, args.days)
+    print(f"Wrote {args.customers} customers, {args.admins} admins, {args.products} products and "
+          f"{args.transactions} transactions to {args.directory}")
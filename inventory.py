@@ -0,0 +1,94 @@
+import threading
+
+
+class OutOfStock(Exception):
+    def __init__(self, product, available):
+        super().__init__(product.product_index, available)
+        self.product = product
+        self.available = available
+
+
+#Stock levels of the products with reservations on top. A checkout first
+#reserves its lines, then commits them once the purchase has gone through or
+#releases them when it fails. Every product has its own lock and no more than
+#one is held at a time, so buyers of different products never wait for each
+#other and carts cannot deadlock; a cart that cannot be reserved in full hands
+#back what it already holds.
+#product.stock is what is on the shelf, reserved units are still part of it
+#until they are committed. Products with stock None are not tracked, they
+#are left out of reservations. A commit is stored together with its purchase
+#(see update_customer in storage.py), it does not mark products.json changed.
+class Inventory:
+    def __init__(self):
+        self.reserved = {}
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def lock(self, product_index):
+        lock = self.locks.get(product_index)
+        if lock is None:
+            with self.locks_lock:
+                lock = self.locks.setdefault(product_index, threading.Lock())
+        return lock
+
+    #None when the product's stock is not tracked
+    def available(self, product):
+        if product.stock is None:
+            return None
+        return product.stock - self.reserved.get(product.product_index, 0)
+
+    #lines are (product, quantity) pairs; returns the reservation to commit or release
+    def reserve(self, lines):
+        reservation = []
+        try:
+            for product, quantity in lines:
+                with self.lock(product.product_index):
+                    available = self.available(product)
+                    if available is None:
+                        continue
+                    if quantity > available:
+                        raise OutOfStock(product, available)
+                    self.reserved[product.product_index] = self.reserved.get(product.product_index, 0) + quantity
+                reservation.append((product, quantity))
+        except OutOfStock:
+            self.release(reservation)
+            raise
+        return tuple(reservation)
+
+    def commit(self, reservation):
+        for product, quantity in reservation:
+            with self.lock(product.product_index):
+                self.unreserve(product.product_index, quantity)
+                product.stock -= quantity
+        return [product for product, quantity in reservation]
+
+    #undoes a commit whose purchase could not be stored
+    def uncommit(self, reservation):
+        for product, quantity in reservation:
+            with self.lock(product.product_index):
+                self.reserved[product.product_index] = self.reserved.get(product.product_index, 0) + quantity
+                product.stock += quantity
+
+    def release(self, reservation):
+        for product, quantity in reservation:
+            with self.lock(product.product_index):
+                self.unreserve(product.product_index, quantity)
+
+    def unreserve(self, product_index, quantity):
+        left = self.reserved[product_index] - quantity
+        if left:
+            self.reserved[product_index] = left
+        else:
+            del self.reserved[product_index]
+
+    #set by a catalog import. Never below what checkouts in progress hold,
+    #their commits would take the stock negative
+    def set_stock(self, product, stock):
+        with self.lock(product.product_index):
+            product.stock = max(stock, self.reserved.get(product.product_index, 0))
+
+    #restocking a product that is not tracked starts tracking it
+    def restock(self, product, quantity):
+        with self.lock(product.product_index):
+            product.stock = (product.stock or 0) + quantity
+            return product.stock
\ No newline at end of file
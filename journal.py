@@ -0,0 +1,116 @@
+import json
+import os
+
+
+#Append-only log of purchases and budget changes. Every line is one JSON
+#record, so a purchase only costs one small write instead of a full save.
+#The log is folded back into the json files by a snapshot (compaction).
+#The first line of the log holds the number of transactions the snapshot
+#had when the log was started, so purchases can be numbered without it.
+#Appends are only fsynced with durable=True; by default a purchase is on
+#disk once the OS writes it back, so a power cut can lose the last ones.
+class Journal:
+    def __init__(self, path="journal.jsonl", compact_every=1000, durable=False):
+        self.path = path
+        self.compact_every = compact_every
+        self.durable = durable
+        self.entries = 0
+        self.base = None
+        self.file = None
+        self.bytes_written = 0
+
+    @staticmethod
+    def read(path):
+        #returns the base count (None for a log without one) and the records
+        try:
+            with open(path, "rb") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return None, []
+
+        base = None
+        entries = []
+        good_end = 0
+        for line in lines:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if good_end == 0 and 'base' in entry:
+                base = entry['base']
+            else:
+                entries.append(entry)
+            good_end += len(line)
+
+        #a crash in the middle of an append leaves a torn last line behind,
+        #cut it off so that new records are not glued onto it
+        if good_end < sum(len(line) for line in lines):
+            with open(path, "r+b") as file:
+                file.truncate(good_end)
+        return base, entries
+
+    @property
+    def old_path(self):
+        #the records a compaction is still folding into the json files
+        return self.path + ".old"
+
+    def replay(self):
+        self.base, entries = self.read(self.path)
+        self.entries = len(entries)
+        return entries
+
+    def write_line(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        self.file.write(line)
+        self.file.flush()
+        self.bytes_written += len(line)
+        if self.durable:
+            os.fsync(self.file.fileno())
+
+    def append(self, entry):
+        if self.file is None:
+            self.file = open(self.path, "a")
+            if self.file.tell() == 0 and self.base is not None:
+                self.write_line({'base': self.base})
+        self.write_line(entry)
+        self.entries += 1
+        return self.entries >= self.compact_every
+
+    def mark(self, entry):
+        #adds a record to old_path, e.g. how far a compaction got; always
+        #fsynced, the compaction relies on it being on disk first
+        with open(self.old_path, "a") as file:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def rotate(self, base):
+        #hands the records over to old_path and starts an empty log; records
+        #left there by a compaction that failed stay in front of the new ones
+        self.close()
+        if os.path.exists(self.old_path):
+            entries = self.read(self.path)[1]
+            with open(self.old_path, "a") as file:
+                for entry in entries:
+                    file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                file.flush()
+                if self.durable:
+                    os.fsync(file.fileno())
+        elif os.path.exists(self.path):
+            os.replace(self.path, self.old_path)
+        self.reset(base)
+
+    def reset(self, base=None):
+        self.close()
+        self.base = base
+        self.file = open(self.path, "w")
+        if base is not None:
+            self.write_line({'base': base})
+        self.entries = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
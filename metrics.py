@@ -0,0 +1,138 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from collections import deque
+
+#OnlineShop methods that are timed while metrics are on.
+OPERATIONS = ('load_data', 'load_history', 'save_data', 'register_user', 'authenticate', 'purchase', 'deposit',
+              'upgrade_membership', 'store_customer', 'compact_journal', 'list_products',
+              'list_transactions', 'search_products', 'add_product', 'update_product', 'upsert_products',
+              'remove_products', 'restock')
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[int(fraction * (len(samples) - 1))] if samples else 0
+
+
+#Opt-in timing of OnlineShop operations. enable() puts a timing wrapper on
+#the shop instance in front of every method in OPERATIONS and disable()
+#removes it again, so a shop without metrics runs the plain methods and pays
+#nothing. Only the latest samples_kept calls of each operation are kept.
+class Metrics:
+    def __init__(self, shop, samples_kept=10000):
+        self.shop = shop
+        self.samples_kept = samples_kept
+        self.enabled = False
+        self.lock = threading.Lock()
+        #operation name -> profile the next call, and the printed result
+        self.profile_next = set()
+        self.profiles = {}
+        self.reset()
+
+    def reset(self):
+        self.shop.catalog_cache.reset_stats()
+        with self.lock:
+            self.counts = {}
+            self.errors = {}
+            self.latencies = {}
+            self.save_bytes = deque(maxlen=self.samples_kept)
+
+    def enable(self):
+        if not self.enabled:
+            for name in OPERATIONS:
+                setattr(self.shop, name, self.wrap(name, getattr(self.shop, name)))
+            self.enabled = True
+
+    def disable(self):
+        if self.enabled:
+            for name in OPERATIONS:
+                delattr(self.shop, name)
+            self.enabled = False
+
+    def profile(self, name):
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        self.profile_next.add(name)
+
+    def wrap(self, name, method):
+        def timed(*args, **kwargs):
+            bytes_before = self.shop.storage.bytes_written
+            failed = True
+            start = time.perf_counter()
+            try:
+                if name in self.profile_next:
+                    self.profile_next.discard(name)
+                    result = self.run_profiled(name, method, args, kwargs)
+                else:
+                    result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                self.record(name, seconds, failed)
+                if name == 'save_data':
+                    self.save_bytes.append(self.shop.storage.bytes_written - bytes_before)
+        timed.__wrapped__ = method
+        return timed
+
+    def run_profiled(self, name, method, args, kwargs):
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(method, *args, **kwargs)
+        finally:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+            self.profiles[name] = output.getvalue()
+
+    def record(self, name, seconds, failed):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if failed:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            samples = self.latencies.get(name)
+            if samples is None:
+                samples = self.latencies[name] = deque(maxlen=self.samples_kept)
+            samples.append(seconds)
+
+    def to_data(self):
+        shop = self.shop
+        with self.lock:
+            operations = {}
+            for name, count in sorted(self.counts.items()):
+                samples = self.latencies[name]
+                operations[name] = {
+                    'count': count,
+                    'errors': self.errors.get(name, 0),
+                    'total_ms': sum(samples) * 1000,
+                    'p50_ms': percentile(samples, 0.5) * 1000,
+                    'p95_ms': percentile(samples, 0.95) * 1000,
+                    'p99_ms': percentile(samples, 0.99) * 1000,
+                }
+            save_bytes = list(self.save_bytes)
+        return {
+            'enabled': self.enabled,
+            'operations': operations,
+            'saves': {
+                'count': len(save_bytes),
+                'bytes_total': sum(save_bytes),
+                'bytes_p50': percentile(save_bytes, 0.5),
+                'bytes_max': max(save_bytes, default=0),
+            },
+            'bytes_written': shop.storage.bytes_written,
+            'records': {
+                'users': len(shop.users),
+                'products': len(shop.products),
+                #None while the history has not been loaded yet
+                'transactions': len(shop.history) if shop.history is not None else None,
+            },
+            'catalog_cache': shop.catalog_cache.stats(),
+            'profiles': sorted(self.profiles),
+        }
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_data(), file, indent=4)
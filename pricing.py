@@ -0,0 +1,106 @@
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#discount rate by membership level
+DISCOUNTS = {0: 0, 1: 0.05, 2: 0.1, 3: 0.15}
+CENT = Decimal("0.01")
+
+
+def discount_for(membership_level):
+    return DISCOUNTS.get(membership_level)
+
+
+def price_line(price, quantity, discount):
+    total_cost = price * quantity
+    discounted_cost = total_cost *discount
+    final_cost = total_cost - discounted_cost
+    return total_cost, discounted_cost, final_cost
+
+
+def to_cents(value):
+    #Decimal(float) is the exact binary value, so rounding happens only once
+    return int(Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+#Prices many (product_index, quantity, membership_level) rows at once. The
+#arithmetic is the same as price_line, done in the same order on float64,
+#so every number equals what a single purchase would have produced.
+#Returns total_cost, discount, discounted_cost and final_cost columns:
+#numpy arrays when numpy is installed, lists otherwise. With cents=True
+#the three costs come back as whole cents instead.
+def price_batch(products, product_indexes, quantities, levels, cents=False):
+    if numpy is None:
+        columns = price_batch_python(products, product_indexes, quantities, levels)
+    else:
+        columns = price_batch_numpy(products, product_indexes, quantities, levels)
+
+    if cents:
+        for name in ('total_cost', 'discounted_cost', 'final_cost'):
+            if numpy is None:
+                columns[name] = array('q', (to_cents(value) for value in columns[name]))
+            else:
+                columns[name] = to_cents_numpy(columns[name])
+    return columns
+
+
+def to_cents_numpy(values):
+    scaled = values * 100
+    cents = numpy.floor(scaled + 0.5)
+    #values * 100 is itself rounded, so anything close to half a cent (or
+    #too large or negative for that to be safe) is settled exactly by to_cents
+    unsure = ((numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6) | (scaled < 0) | (scaled >= 2 ** 40))
+    for position in numpy.flatnonzero(unsure):
+        cents[position] = to_cents(float(values[position]))
+    return cents.astype(numpy.int64)
+
+
+def price_batch_python(products, product_indexes, quantities, levels):
+    columns = {'total_cost': [], 'discount': [], 'discounted_cost': [], 'final_cost': []}
+    for product_index, quantity, level in zip(product_indexes, quantities, levels):
+        product = products.get(product_index)
+        if product is None:
+            raise KeyError(f"Product not found: {product_index}")
+        discount = DISCOUNTS[level]
+        total_cost, discounted_cost, final_cost = price_line(product.price, quantity, discount)
+        columns['total_cost'].append(total_cost)
+        columns['discount'].append(discount)
+        columns['discounted_cost'].append(discounted_cost)
+        columns['final_cost'].append(final_cost)
+    return columns
+
+
+def price_batch_numpy(products, product_indexes, quantities, levels):
+    #sorted catalog keys let searchsorted map every row to its price
+    keys = numpy.fromiter(products.keys(), dtype=numpy.int64, count=len(products))
+    prices = numpy.fromiter((product.price for product in products.values()), dtype=numpy.float64,
+                            count=len(products))
+    order = numpy.argsort(keys)
+    keys = keys[order]
+    prices = prices[order]
+
+    product_indexes = numpy.asarray(product_indexes, dtype=numpy.int64)
+    if len(keys) == 0 and len(product_indexes):
+        raise KeyError(f"Product not found: {product_indexes[0]}")
+    positions = numpy.searchsorted(keys, product_indexes)
+    positions[positions == len(keys)] = 0
+    missing = keys[positions] != product_indexes
+    if numpy.any(missing):
+        raise KeyError(f"Product not found: {product_indexes[numpy.argmax(missing)]}")
+
+    discount_table = numpy.array([DISCOUNTS[level] for level in range(len(DISCOUNTS))], dtype=numpy.float64)
+    levels = numpy.asarray(levels, dtype=numpy.int64)
+    #negative levels would index from the end, raise like DISCOUNTS[level] does
+    unknown = (levels < 0) | (levels >= len(discount_table))
+    if numpy.any(unknown):
+        raise KeyError(int(levels[numpy.argmax(unknown)]))
+    discount = discount_table[levels]
+    total_cost = prices[positions] * numpy.asarray(quantities, dtype=numpy.int64)
+    discounted_cost = total_cost * discount
+    final_cost = total_cost - discounted_cost
+    return {'total_cost': total_cost, 'discount': discount,
+            'discounted_cost': discounted_cost, 'final_cost': final_cost}
@@ -1,7 +1,21 @@
+from collections import namedtuple
+
+#read only copy of a product, handed out by the catalog cache. Stock is left
+#out, purchases change it without emptying the cache
+ProductView = namedtuple('ProductView', ['product_index', 'product_name', 'price', 'manufacturer', 'remarks'])
+
+#stock None means the stock is not tracked and any quantity can be bought,
+#as for products stored before stock was kept
 class Product:
-    def __init__(self, product_index, product_name, price, manufacturer, remarks):
+    __slots__ = ('product_index', 'product_name', 'price', 'manufacturer', 'remarks', 'stock')
+
+    def __init__(self, product_index, product_name, price, manufacturer, remarks, stock=None):
         self.product_index = product_index
         self.product_name = product_name
         self.price = price
         self.manufacturer = manufacturer
         self.remarks = tuple(remarks)
+        self.stock = stock
+
+    def view(self):
+        return ProductView(self.product_index, self.product_name, self.price, self.manufacturer, self.remarks)
\ No newline at end of file
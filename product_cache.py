@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+
+#Results of catalog reads (listing pages, search results, rendered text)
+#kept for as long as the catalog does not change. Every change to the
+#catalog calls invalidate(), which bumps the version; the first read after
+#that finds a new version and drops everything, so nothing stale is ever
+#served and writes never have to say which entries they touched. Only the
+#latest max_entries results are kept.
+class CatalogCache:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        #version of the catalog and the one the entries were built from
+        self.catalog_version = 0
+        self.version = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+
+    def invalidate(self):
+        with self.lock:
+            self.catalog_version += 1
+
+    def get(self, key, build):
+        version = self.catalog_version
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        #built outside the lock; a result built while the catalog changed is
+        #handed back but not kept
+        value = build()
+        with self.lock:
+            if self.version == version == self.catalog_version:
+                self.entries[key] = value
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
\ No newline at end of file
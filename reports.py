@@ -0,0 +1,70 @@
+import datetime
+import heapq
+from transaction_store import EPOCH, date_to_timestamp
+
+DAY = 86400
+
+
+#Running sales totals kept up to date on every purchase, so admin reports
+#never have to walk through the transaction history.
+class SalesReport:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.transaction_count = 0
+        self.total_revenue = 0
+        self.total_discount = 0
+        #product_index -> [quantity, revenue], username -> [purchases, revenue], day -> [purchases, revenue]
+        self.by_product = {}
+        self.by_customer = {}
+        self.by_day = {}
+
+    def add(self, username, product_index, quantity, discounted_cost, final_cost, timestamp):
+        self.transaction_count += 1
+        self.total_revenue += final_cost
+        self.total_discount += discounted_cost
+
+        totals = self.by_product.get(product_index)
+        if totals is None:
+            totals = self.by_product[product_index] = [0, 0]
+        totals[0] += quantity
+        totals[1] += final_cost
+
+        totals = self.by_customer.get(username)
+        if totals is None:
+            totals = self.by_customer[username] = [0, 0]
+        totals[0] += 1
+        totals[1] += final_cost
+
+        day = timestamp // DAY
+        totals = self.by_day.get(day)
+        if totals is None:
+            totals = self.by_day[day] = [0, 0]
+        totals[0] += 1
+        totals[1] += final_cost
+
+    def add_transaction(self, transaction):
+        self.add(transaction.username, transaction.product_index, transaction.quantity,
+                 transaction.discounted_cost, transaction.final_cost, date_to_timestamp(transaction.date))
+
+    def rebuild(self, transactions):
+        self.clear()
+        #read the store's columns directly instead of building Transaction objects
+        names = transactions.names
+        for user_id, product_index, quantity, discounted_cost, final_cost, timestamp in zip(
+                transactions.user_ids, transactions.product_indexes, transactions.quantities,
+                transactions.discounted_costs, transactions.final_costs, transactions.timestamps):
+            self.add(names[user_id], product_index, quantity, discounted_cost, final_cost, timestamp)
+
+    def top_products(self, limit=10):
+        return heapq.nlargest(limit, ((product_index, totals[0], totals[1])
+                                      for product_index, totals in self.by_product.items()), key=lambda row: row[2])
+
+    def top_customers(self, limit=10):
+        return heapq.nlargest(limit, ((username, totals[0], totals[1])
+                                      for username, totals in self.by_customer.items()), key=lambda row: row[2])
+
+    def daily_sales(self):
+        return [((EPOCH + datetime.timedelta(days=day)).date().isoformat(), totals[0], totals[1])
+                for day, totals in sorted(self.by_day.items())]
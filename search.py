@@ -0,0 +1,117 @@
+import bisect
+import heapq
+
+
+#Inverted index over product names, manufacturers and remarks. Every token
+#points to the products that contain it, so a query only touches the
+#products that match instead of the whole catalog.
+class ProductSearchIndex:
+    #a hit in the name counts more than a hit in the manufacturer or remarks
+    name_weight = 3
+    manufacturer_weight = 2
+    remarks_weight = 1
+
+    def __init__(self):
+        self.postings = {}
+        self.tokens = []
+        self.documents = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def tokenize(self, product):
+        weights = {}
+        for token in str(product.product_name).lower().split():
+            weights[token] = weights.get(token, 0) + self.name_weight
+        for token in str(product.manufacturer).lower().split():
+            weights[token] = weights.get(token, 0) + self.manufacturer_weight
+        for remark in product.remarks:
+            token = str(remark).lower()
+            weights[token] = weights.get(token, 0) + self.remarks_weight
+        return weights
+
+    def add(self, product):
+        if product.product_index in self.documents:
+            self.remove(product.product_index)
+
+        weights = self.tokenize(product)
+        self.documents[product.product_index] = weights
+        for token, weight in weights.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                bisect.insort(self.tokens, token)
+            posting[product.product_index] = weight
+
+    def update(self, product):
+        self.add(product)
+
+    def remove(self, product_index):
+        weights = self.documents.pop(product_index, None)
+        if weights is None:
+            return
+        for token in weights:
+            posting = self.postings[token]
+            del posting[product_index]
+            if not posting:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def rebuild(self, products):
+        self.postings = {}
+        self.documents = {}
+        for product in products:
+            weights = self.tokenize(product)
+            self.documents[product.product_index] = weights
+            for token, weight in weights.items():
+                self.postings.setdefault(token, {})[product.product_index] = weight
+        self.tokens = sorted(self.postings)
+
+    def match(self, term):
+        #"term*" matches every token starting with term, anything else must match exactly
+        if not term.endswith("*"):
+            posting = self.postings.get(term)
+            return [posting] if posting is not None else []
+
+        prefix = term[:-1]
+        postings = []
+        start = bisect.bisect_left(self.tokens, prefix)
+        #walks on from start by position, slicing would copy the rest of the list
+        for position in range(start, len(self.tokens)):
+            token = self.tokens[position]
+            if not token.startswith(prefix):
+                break
+            postings.append(self.postings[token])
+        return postings
+
+    def search(self, query, limit=10):
+        terms = query.lower().split()
+        if not terms:
+            return []
+
+        #every term has to match (AND), so start from the rarest one and
+        #only look the remaining candidates up in the other terms' postings
+        matches = sorted((self.match(term) for term in terms),
+                         key=lambda postings: sum(len(posting) for posting in postings))
+        scores = {}
+        for posting in matches[0]:
+            for product_index, weight in posting.items():
+                if weight > scores.get(product_index, 0):
+                    scores[product_index] = weight
+
+        for postings in matches[1:]:
+            if not scores:
+                break
+            best = {}
+            for posting in postings:
+                #walk whichever side is smaller
+                if len(posting) < len(scores):
+                    common = [product_index for product_index in posting if product_index in scores]
+                else:
+                    common = [product_index for product_index in scores if product_index in posting]
+                for product_index in common:
+                    if posting[product_index] > best.get(product_index, 0):
+                        best[product_index] = posting[product_index]
+            scores = {product_index: scores[product_index] + weight for product_index, weight in best.items()}
+
+        return heapq.nlargest(limit, scores, key=scores.get)
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from Customer import Customer
+from auth import SessionCache
+from journal import Journal
+from shop import OnlineShop, ShopError
+from storage import JsonStorage, SqliteStorage
+
+
+#Serves many customers at once. Every client sends one JSON request per
+#line and gets one JSON response per line back, e.g.
+#  {"op": "login", "username": "1", "password": "111111"}
+#  {"op": "purchase", "session": "...", "lines": [[1, 2], [5, 1]]}
+#  {"op": "add_money", "session": "...", "amount": 10}
+#  {"op": "increase_membership_level", "session": "..."}
+#Requests run on a thread pool; OnlineShop locks each account, so two
+#sessions of the same customer can never overspend the budget. Logins run
+#the password hash on a pool of their own, one thread per core, so a burst
+#of logins cannot hold up purchases of customers already logged in.
+class ShopServer:
+    def __init__(self, shop, workers=8, login_workers=None, max_sessions=10000):
+        self.shop = shop
+        self.sessions = SessionCache(max_sessions)
+        self.executor = ThreadPoolExecutor(workers)
+        self.login_executor = ThreadPoolExecutor(login_workers or os.cpu_count())
+        self.handlers = {
+            'login': self.login,
+            'logout': self.logout,
+            'budget': self.budget,
+            'purchase': self.purchase,
+            'add_money': self.add_money,
+            'increase_membership_level': self.increase_membership_level,
+        }
+
+    def handle(self, request):
+        handler = self.handlers.get(request.get('op'))
+        if handler is None:
+            return {'ok': False, 'error': "Unknown operation."}
+        try:
+            response = handler(request)
+        except ShopError as error:
+            return {'ok': False, 'error': str(error)}
+        except (KeyError, TypeError, ValueError):
+            return {'ok': False, 'error': "Malformed request."}
+        response['ok'] = True
+        return response
+
+    def customer(self, request):
+        user = self.shop.users.get(self.sessions.get(request['session']))
+        if not isinstance(user, Customer):
+            raise ShopError("You must be a customer to perform this action.")
+        return user
+
+    def login(self, request):
+        user = self.shop.authenticate(request['username'], request['password'])
+        return {'session': self.sessions.add(user.username), 'role': user.role}
+
+    def logout(self, request):
+        self.sessions.remove(request['session'])
+        return {}
+
+    def budget(self, request):
+        customer = self.customer(request)
+        return {'budget': customer.budget, 'membership_level': customer.membership_level}
+
+    def purchase(self, request):
+        customer = self.customer(request)
+        lines = [(int(product_index), int(quantity)) for product_index, quantity in request['lines']]
+        transactions = self.shop.purchase(customer, lines)
+        return {'budget': customer.budget,
+                'final_cost': sum(transaction.final_cost for transaction in transactions)}
+
+    def add_money(self, request):
+        customer = self.customer(request)
+        return {'budget': self.shop.deposit(customer, float(request['amount']))}
+
+    def increase_membership_level(self, request):
+        customer = self.customer(request)
+        level = self.shop.upgrade_membership(customer)
+        return {'membership_level': level, 'budget': customer.budget}
+
+    async def serve_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            #valid JSON that is not an object, e.g. [1, 2], is just as malformed
+            if not isinstance(request, dict):
+                response = {'ok': False, 'error': "Malformed request."}
+            else:
+                executor = self.login_executor if request.get('op') == 'login' else self.executor
+                response = await loop.run_in_executor(executor, self.handle, request)
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online Shopping server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--login-workers", type=int)
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--database", default="shop.db")
+    parser.add_argument("--durable", action="store_true", help="fsync every journal record")
+    args = parser.parse_args()
+
+    shop = OnlineShop(SqliteStorage(args.database) if args.storage == "sqlite"
+                      else JsonStorage(journal=Journal(durable=args.durable)))
+    shop.load_data()
+    try:
+        asyncio.run(ShopServer(shop, args.workers, args.login_workers, args.max_sessions).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shop.save_data()
+        shop.storage.close()
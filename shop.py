@@ -0,0 +1,563 @@
+import bisect
+import datetime
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+from User import User
+from transaction import Transaction
+from product import Product, ProductView
+from product_cache import CatalogCache
+from inventory import Inventory, OutOfStock
+from Admin import Admin
+from Customer import Customer
+from storage import JsonStorage
+from search import ProductSearchIndex
+from transaction_store import TransactionStore, date_to_timestamp
+from reports import SalesReport
+from pricing import discount_for, price_batch, price_line
+from auth import PasswordHasher
+from metrics import Metrics
+from analytics import PartitionedHistory
+
+#By adding tuples, the code ensures that the remarks and date attribute
+#are immutable and can be stored and retrieved consistently
+
+
+class ShopError(Exception):
+    pass
+
+
+#The shop itself, without any console I/O: every operation takes its
+#input as arguments, returns its result and raises ShopError when it cannot
+#be done. cli.ShopCLI and server.ShopServer are the front ends; permission
+#checks belong to them, since they know who is logged in.
+class OnlineShop:
+    def __init__(self, storage=None):
+        #users are keyed by username and products by product_index, so
+        #lookups do not have to scan every record
+        self.users = {}
+        self.products = {}
+        #the transaction history is only read from storage when something
+        #first needs it, see the transactions property
+        self.history = TransactionStore()
+        self.level_cost = {1: 5, 2: 10, 3: 20}
+        self.storage = storage if storage is not None else JsonStorage()
+        #collections ('users', 'products') changed since the last save, purchases
+        #are stored as they happen; the mutations below add to it, save_data
+        #writes and clears it
+        self.changed = set()
+        #save_data runs after every flush_every mutations, or once
+        #flush_interval milliseconds have passed since the last save
+        self.flush_every = 1
+        self.flush_interval = None
+        self.pending_saves = 0
+        self.last_save = time.monotonic()
+        #saves what is pending once flush_interval is up, when no mutation comes to do it
+        self.flush_timer = None
+        self.page_size = 20
+        self.search_index = ProductSearchIndex()
+        #listing pages and search results, kept until the catalog changes
+        self.catalog_cache = CatalogCache()
+        #(catalog version, product indexes in order) for the listings
+        self.product_indexes = None
+        #stock reservations of checkouts in progress, locked per product
+        self.inventory = Inventory()
+        self.sales = SalesReport()
+        self.passwords = PasswordHasher()
+        #off until enabled from the admin menu or with --metrics
+        self.metrics = Metrics(self)
+        #budgets are guarded per account so different customers never wait
+        #for each other; write_lock covers the shared transaction list and storage
+        self.account_locks = {}
+        self.account_locks_lock = threading.Lock()
+        self.write_lock = threading.RLock()
+
+    def load_data(self) -> None:
+        self.users, self.products = self.storage.load()
+        self.history = None
+        self.search_index.rebuild(self.products.values())
+        self.catalog_changed()
+        self.sales.clear()
+        self.changed = set()
+        self.migrate_passwords()
+
+    def migrate_passwords(self):
+        #users.json from before password hashing holds plain text passwords
+        users = [user for user in self.users.values() if not self.passwords.is_hashed(user.password)]
+        if not users:
+            return
+        with ThreadPoolExecutor(os.cpu_count()) as executor:
+            hashes = list(executor.map(self.passwords.hash, [user.password for user in users]))
+        with self.write_lock:
+            for user, password_hash in zip(users, hashes):
+                user.password = password_hash
+            self.storage.update_passwords(users)
+            self.changed.add('users')
+            self.save_data()
+
+    @property
+    def transactions(self):
+        return self.load_history()
+
+    def load_history(self) -> TransactionStore:
+        if self.history is None:
+            with self.write_lock:
+                if self.history is None:
+                    history = self.storage.load_transactions()
+                    self.sales.rebuild(history)
+                    self.history = history
+        return self.history
+
+    def account_lock(self, username):
+        lock = self.account_locks.get(username)
+        if lock is None:
+            with self.account_locks_lock:
+                lock = self.account_locks.setdefault(username, threading.Lock())
+        return lock
+
+    #writes the customer, their purchases and the stock they took; returns
+    #True when the journal is due to be compacted. Nothing is changed when
+    #storage fails, except the budget the caller set and has to put back
+    def store_customer(self, customer, transactions=(), reservation=()):
+        with self.write_lock:
+            position = None
+            if transactions and self.history is not None:
+                position = len(self.history)
+            elif transactions and self.storage.needs_history:
+                position = self.storage.history_length
+                if position is None:
+                    #no count on record, e.g. a journal from an older version
+                    position = len(self.load_history())
+            #committed under write_lock, so the stored stock levels are written in the order they were taken
+            products = self.inventory.commit(reservation) if reservation else ()
+            try:
+                save_due = self.storage.update_customer(customer, transactions, position, products)
+            except BaseException:
+                #nothing was stored, the units are held by the reservation again
+                self.inventory.uncommit(reservation)
+                raise
+            if transactions and self.history is not None:
+                self.history.extend(transactions)
+                for transaction in transactions:
+                    self.sales.add_transaction(transaction)
+            return save_due
+
+    def compact_journal(self):
+        #the storage folds the journal into its files while saving
+        with self.write_lock:
+            self.save_data()
+
+    def save_data(self) -> None:
+        with self.write_lock:
+            changed = set(self.changed)
+            self.storage.save(self.users, self.products, self.history, changed)
+
+            self.changed -= changed
+            self.pending_saves = 0
+            self.last_save = time.monotonic()
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+
+    def request_save(self):
+        with self.write_lock:
+            self.pending_saves += 1
+            if self.pending_saves >= self.flush_every:
+                self.save_data()
+            elif self.flush_interval is not None:
+                remaining = self.flush_interval / 1000 - (time.monotonic() - self.last_save)
+                if remaining <= 0:
+                    self.save_data()
+                elif self.flush_timer is None:
+                    self.flush_timer = threading.Timer(remaining, self.flush_pending)
+                    #a shop that is shutting down saves in its exit path, not here
+                    self.flush_timer.daemon = True
+                    self.flush_timer.start()
+
+    def flush_pending(self):
+        with self.write_lock:
+            #a save since the timer fired has already taken care of it
+            if self.pending_saves:
+                self.save_data()
+
+    def register_user(self, username: str, password: str, role: str, name: str, budget: float = 0.0) -> User:
+        if self.is_username_taken(username):
+            raise ShopError("Username already exists.")
+        if len(password) < 6:
+            raise ShopError("Password must be at least 6 characters.")
+
+        role = role.lower()
+        if role == 'admin':
+            user = Admin(username, self.passwords.hash(password), name)
+        elif role == 'customer':
+            user = Customer(username, self.passwords.hash(password), name, 0, budget)
+        else:
+            raise ShopError("Invalid role.")
+
+        #checked again under the lock, another registration may have taken the
+        #name while the password was hashed
+        with self.write_lock:
+            if self.is_username_taken(username):
+                raise ShopError("Username already exists.")
+            self.users[username] = user
+            self.storage.add_user(user)
+            self.changed.add('users')
+            self.request_save()
+        return user
+
+    def authenticate(self, username: str, password: str) -> User:
+        user = self.users.get(username)
+        stored = user.password if user is not None else self.passwords.dummy_hash
+        if not self.passwords.verify(stored, password) or user is None:
+            raise ShopError("Invalid username or password.")
+
+        if self.passwords.needs_rehash(stored):
+            #the cost was changed since this password was hashed
+            with self.write_lock:
+                user.password = self.passwords.hash(password)
+                self.storage.update_passwords([user])
+                self.changed.add('users')
+                self.request_save()
+        return user
+
+    def is_username_taken(self, username: str) -> bool:
+        return username in self.users
+
+    def list_customers(self) -> list[Customer]:
+        return [user for user in self.users.values() if isinstance(user, Customer)]
+
+    def add_product(self, product_index: int, product_name: str, price: float, manufacturer: str,
+                    remarks: Iterable[str] = (), stock: int | None = None) -> Product:
+        if stock is not None and stock < 0:
+            raise ShopError("Invalid quantity.")
+        with self.write_lock:
+            if product_index in self.products:
+                raise ShopError("product index must be unique and cannot be repeated")
+            product = Product(product_index, product_name, price, manufacturer, remarks, stock)
+            self.products[product_index] = product
+            self.search_index.add(product)
+            self.catalog_changed()
+            self.storage.save_products([product])
+            self.request_save()
+        return product
+
+    def update_product(self, product_index: int, product_name: str, price: float, manufacturer: str,
+                       remarks: Iterable[str] = ()) -> Product:
+        with self.write_lock:
+            product = self.find_product_by_index(product_index)
+            if product is None:
+                raise ShopError("Product not found.")
+            product.product_name = product_name
+            product.price = price
+            product.manufacturer = manufacturer
+            product.remarks = tuple(remarks)
+            self.search_index.update(product)
+            self.catalog_changed()
+            self.storage.save_products([product])
+            self.request_save()
+        return product
+
+    #a product with stock None keeps the stock it has, or is not tracked
+    def upsert_products(self, products: list[Product]) -> None:
+        with self.write_lock:
+            #the records as they are now in the shop, a feed row may lack the stock
+            merged = []
+            for product in products:
+                existing = self.products.get(product.product_index)
+                if existing is None:
+                    self.products[product.product_index] = product
+                    self.search_index.add(product)
+                    merged.append(product)
+                else:
+                    existing.product_name = product.product_name
+                    existing.price = product.price
+                    existing.manufacturer = product.manufacturer
+                    existing.remarks = product.remarks
+                    if product.stock is not None:
+                        self.inventory.set_stock(existing, product.stock)
+                    self.search_index.update(existing)
+                    merged.append(existing)
+            self.catalog_changed()
+            self.storage.save_products(merged)
+            self.save_data()
+
+    def remove_products(self, product_indexes: Iterable[int]) -> int:
+        with self.write_lock:
+            removed = []
+            for product_index in product_indexes:
+                if self.products.pop(product_index, None) is not None:
+                    self.search_index.remove(product_index)
+                    removed.append(product_index)
+
+            removed_count = len(removed)
+            if removed_count > 0:
+                self.storage.delete_products(removed)
+                self.catalog_changed()
+                self.request_save()
+        return removed_count
+
+    def restock(self, product_index: int, quantity: int) -> int:
+        if quantity <= 0:
+            raise ShopError("Invalid quantity.")
+        with self.write_lock:
+            product = self.find_product_by_index(product_index)
+            if product is None:
+                raise ShopError("Product not found.")
+            stock = self.inventory.restock(product, quantity)
+            self.storage.save_products([product])
+            self.changed.add('products')
+            self.request_save()
+        return stock
+
+    #what can still be bought, stock held by checkouts in progress is not counted;
+    #None for a product whose stock is not tracked
+    def available_stock(self, product_index: int) -> int | None:
+        product = self.find_product_by_index(product_index)
+        if product is None:
+            raise ShopError("Product not found.")
+        return self.inventory.available(product)
+
+    def catalog_changed(self):
+        #called once the products and the search index are both up to date,
+        #so a read in between is not kept under the new version
+        self.catalog_cache.invalidate()
+        self.changed.add('products')
+
+    def iter_products(self, offset: int = 0, limit: int | None = None, manufacturer: str | None = None,
+                      min_price: float | None = None, max_price: float | None = None,
+                      keyword: str | None = None, after: int | None = None) -> Iterator[Product]:
+        #products come in product_index order; after starts behind that index
+        #instead of counting past every product before it like offset does
+        order = self.product_order()
+        start = 0 if after is None else bisect.bisect_right(order, after)
+        products = (self.products.get(order[position]) for position in range(start, len(order)))
+        products = (product for product in products if product is not None)
+        if manufacturer is not None:
+            products = (product for product in products if product.manufacturer == manufacturer)
+        if min_price is not None:
+            products = (product for product in products if product.price >= min_price)
+        if max_price is not None:
+            products = (product for product in products if product.price <= max_price)
+        if keyword is not None:
+            products = (product for product in products if keyword in product.remarks)
+        #islice stops pulling records as soon as the page is full
+        return itertools.islice(products, offset, None if limit is None else offset + limit)
+
+    def product_order(self):
+        #sorted once per catalog version, the dict keeps insertion order only
+        version = self.catalog_cache.catalog_version
+        indexes = self.product_indexes
+        if indexes is None or indexes[0] != version:
+            indexes = (version, tuple(sorted(self.products)))
+            self.product_indexes = indexes
+        return indexes[1]
+
+    def iter_transactions(self, offset: int = 0, limit: int | None = None, username: str | None = None,
+                          start_date: str | None = None, end_date: str | None = None) -> Iterator[Transaction]:
+        #the filters run on the store's columns, Transaction objects are only
+        #built for the rows that end up in the page
+        history = self.transactions
+        positions = iter(range(len(history)))
+        if username is not None:
+            user_id = history.name_ids.get(username)
+            positions = iter(()) if user_id is None else self.user_positions(history, user_id)
+        #dates are "YYYY-MM-DD"; the end date counts as a whole day
+        if start_date is not None:
+            start = self.day_timestamp(start_date)
+            positions = (position for position in positions if history.timestamps[position] >= start)
+        if end_date is not None:
+            end = self.day_timestamp(end_date) + 86400
+            positions = (position for position in positions if history.timestamps[position] < end)
+        positions = itertools.islice(positions, offset, None if limit is None else offset + limit)
+        return (history[position] for position in positions)
+
+    @staticmethod
+    def user_positions(history, user_id):
+        #array.index scans in C, much faster than comparing row by row in Python
+        user_ids = history.user_ids
+        position = 0
+        while True:
+            try:
+                position = user_ids.index(user_id, position)
+            except ValueError:
+                return
+            yield position
+            position += 1
+
+    @staticmethod
+    def day_timestamp(day):
+        try:
+            return date_to_timestamp((day, "00:00:00"))
+        except ValueError:
+            raise ShopError("Invalid date, use YYYY-MM-DD.")
+
+    #one page of a listing and whether there is a page after it
+    #pages are cached as read only ProductViews, change products through
+    #update_product and the other catalog operations
+    #after is the product_index the previous page ended on; the page then
+    #starts behind it and page is not used, so deep pages cost no more than the first
+    def list_products(self, page: int = 1, after: int | None = None,
+                      **filters) -> tuple[tuple[ProductView, ...], bool]:
+        return self.catalog_cache.get(('products', self.page_size, page, after, tuple(sorted(filters.items()))),
+                                      lambda: self.build_product_page(page, after, filters))
+
+    def build_product_page(self, page, after, filters):
+        offset = (page - 1) * self.page_size if after is None else 0
+        #one extra record is fetched to know whether there is a next page
+        products = [product.view() for product in
+                    self.iter_products(offset, self.page_size + 1, after=after, **filters)]
+        return tuple(products[:self.page_size]), len(products) > self.page_size
+
+    def list_transactions(self, page: int = 1, **filters) -> tuple[list[Transaction], bool]:
+        transactions = list(self.iter_transactions((page - 1) * self.page_size, self.page_size + 1, **filters))
+        return transactions[:self.page_size], len(transactions) > self.page_size
+
+    def search_products(self, query: str, limit: int = 10) -> tuple[ProductView, ...]:
+        return self.catalog_cache.get(('search', query, limit), lambda: tuple(
+            self.products[product_index].view() for product_index in self.search_index.search(query, limit)))
+
+    def sales_report(self) -> SalesReport:
+        #the running totals are built when the history is first loaded
+        self.load_history()
+        return self.sales
+
+    #for queries over the whole history that should use every core, see analytics.py
+    def partition_history(self, directory: str, by: str = "date", partitions: int = 8) -> PartitionedHistory:
+        #only the length is taken under the lock; the history is append only, so
+        #its first rows stay the same while the partitions are written
+        with self.write_lock:
+            history = self.transactions
+            rows = len(history)
+        return PartitionedHistory.create(history, directory, by, partitions, rows)
+
+    def purchase(self, customer: Customer, lines: Iterable[tuple[int, int]]) -> list[Transaction]:
+        #the same product bought on several lines is merged into one transaction
+        products = {}
+        quantities = {}
+        for product_index, quantity in lines:
+            product = self.products.get(product_index)
+            if product is None:
+                raise ShopError(f"Product not found: {product_index}")
+            if quantity <= 0:
+                raise ShopError("Invalid quantity.")
+            products[product_index] = product
+            quantities[product_index] = quantities.get(product_index, 0) + quantity
+        if not quantities:
+            raise ShopError("Cart is empty.")
+
+        #the stock is held before the budget is checked and committed together
+        #with the purchase by store_customer
+        try:
+            reservation = self.inventory.reserve(
+                [(products[product_index], quantity) for product_index, quantity in quantities.items()])
+        except OutOfStock as error:
+            raise ShopError(f"Not enough stock of product {error.product.product_index}: "
+                            f"{max(error.available, 0)} left.")
+
+        with self.account_lock(customer.username):
+            budget = customer.budget
+            try:
+                discount = self.calculate_discount(customer.membership_level)
+                priced = []
+                total_final_cost = 0
+                for product_index, quantity in quantities.items():
+                    total_cost, discounted_cost, final_cost = price_line(products[product_index].price,
+                                                                         quantity, discount)
+                    priced.append((product_index, quantity, total_cost, discounted_cost, final_cost))
+                    total_final_cost += final_cost
+
+                if total_final_cost > customer.budget:
+                    raise ShopError("Insufficient budget.")
+
+                date = str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")).split()
+
+                transactions = []
+                for product_index, quantity, total_cost, discounted_cost, final_cost in priced:
+                    customer.budget -= final_cost
+                    transactions.append(Transaction(customer.username, product_index, quantity, total_cost,
+                                                    discount, discounted_cost, final_cost, date))
+                save_due = self.store_customer(customer, transactions, reservation)
+            except BaseException:
+                #the purchase was not stored, so it did not happen
+                customer.budget = budget
+                self.inventory.release(reservation)
+                raise
+        #the purchase is stored by now, a failing compaction does not undo it
+        if save_due:
+            self.compact_journal()
+        return transactions
+
+    def deposit(self, customer: Customer, amount: float) -> float:
+        if amount <= 0:
+            raise ShopError("Invalid amount.")
+
+        with self.account_lock(customer.username):
+            budget = customer.budget
+            try:
+                customer.budget += amount
+                save_due = self.store_customer(customer)
+            except BaseException:
+                #the deposit was not stored, so it did not happen
+                customer.budget = budget
+                raise
+            budget = customer.budget
+        if save_due:
+            self.compact_journal()
+        return budget
+
+    def calculate_discount(self, membership_level: int) -> float:
+        return discount_for(membership_level)
+
+    def price_orders(self, product_indexes: Iterable[int], quantities: Iterable[int],
+                     membership_levels: Iterable[int], cents: bool = False) -> dict:
+        try:
+            return price_batch(self.products, product_indexes, quantities, membership_levels, cents)
+        except KeyError as error:
+            #price_batch names a missing product, a bare level comes from the discount table
+            missing = error.args[0]
+            if isinstance(missing, str):
+                raise ShopError(missing) from None
+            raise ShopError(f"Invalid membership level: {missing}") from None
+
+    def set_membership_cost(self, level: int, cost: int) -> None:
+        if level not in self.level_cost:
+            raise ShopError("invalid input")
+        self.level_cost[level] = cost
+
+    #the next level and what it costs, without buying it
+    def membership_upgrade(self, customer: Customer) -> tuple[int, int]:
+        if customer.membership_level == 3:
+            raise ShopError("You have reached the maximum membership level.")
+
+        next_level = customer.membership_level + 1
+        cost = self.level_cost.get(next_level, 0)
+
+        if cost == 0:
+            raise ShopError("Invalid membership level.")
+
+        if cost > customer.budget:
+            raise ShopError("Insufficient budget.")
+        return next_level, cost
+
+    def upgrade_membership(self, customer: Customer) -> int:
+        with self.account_lock(customer.username):
+            #checked again under the lock, the budget may have changed meanwhile
+            next_level, cost = self.membership_upgrade(customer)
+            budget, level = customer.budget, customer.membership_level
+            try:
+                customer.budget -= cost
+                customer.membership_level = next_level
+                save_due = self.store_customer(customer)
+            except BaseException:
+                customer.budget, customer.membership_level = budget, level
+                raise
+        if save_due:
+            self.compact_journal()
+        return next_level
+
+    def find_product_by_index(self, product_index: int) -> Product | None:
+        return self.products.get(product_index)
+
@@ -0,0 +1,598 @@
+import json
+import os
+import sqlite3
+import threading
+from transaction import Transaction
+from product import Product
+from Admin import Admin
+from Customer import Customer
+from journal import Journal
+from transaction_store import TransactionStore
+
+
+#Both storage classes offer the same methods, so OnlineShop does not care
+#where its data lives:
+#  load()                                   -> users, products
+#  load_transactions()                      -> TransactionStore, read only when first needed
+#  save(users, products, transactions, changed)   transactions is None while not loaded
+#  add_user(user)
+#  update_customer(customer, transactions=(), position=None, products=()) -> True when a save is due
+#                                           products are those whose stock the purchase changed,
+#                                           position is the length of the history when needs_history
+#                                           is set, taken from history_length while it is not loaded
+#  update_passwords(users)
+#  save_products(products)
+#  delete_products(product_indexes)
+#  close()
+
+
+def user_from_data(user_data):
+    if user_data['role'] == 'customer':
+        return Customer(user_data['username'], user_data['password'], user_data['name'],
+                        user_data['membership_level'], user_data['budget'])
+    elif user_data['role'] == 'admin':
+        return Admin(user_data['username'], user_data['password'], user_data['name'])
+    return None
+
+
+def user_to_data(user):
+    user_data = {
+        'username': user.username,
+        'password': user.password,
+        'role': user.role,
+        'name': user.name
+    }
+    if isinstance(user, Customer):
+        user_data['membership_level'] = user.membership_level
+        user_data['budget'] = user.budget
+    return user_data
+
+
+def product_from_data(product_data):
+    return Product(product_data['product_index'], product_data['product_name'],
+                   product_data['price'], product_data['manufacturer'], product_data['remarks'],
+                   product_data.get('stock'))
+
+
+def product_to_data(product):
+    return {
+        'product_index': product.product_index,
+        'product_name': product.product_name,
+        'price': product.price,
+        'manufacturer': product.manufacturer,
+        'remarks': tuple(product.remarks),
+        'stock': product.stock
+    }
+
+
+def transaction_from_data(transaction_data):
+    return Transaction(transaction_data['username'], transaction_data['product_index'],
+                       transaction_data['quantity'], transaction_data['total_cost'],
+                       transaction_data['discount'], transaction_data['discounted_cost'],
+                       transaction_data['final_cost'], transaction_data['date'])
+
+
+def transaction_to_data(transaction):
+    return {
+        'username': transaction.username,
+        'product_index': transaction.product_index,
+        'quantity': transaction.quantity,
+        'total_cost': transaction.total_cost,
+        'discount': transaction.discount,
+        'discounted_cost':transaction.discounted_cost,
+        'final_cost': transaction.final_cost,
+        'date': tuple(transaction.date) #convert date into tuple
+    }
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    #yields the items of a top level json array one at a time, reading the
+    #file in chunks instead of parsing the whole document at once
+    decoder = json.JSONDecoder()
+    with open(path, "r") as file:
+        buffer = ""
+        position = 0
+        started = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path} does not contain a json array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    #the item continues in the next chunk
+                    end = len(buffer)
+                #a number cut off by the chunk boundary would still decode,
+                #so an item only counts once the separator after it is read
+                if end < len(buffer) and buffer[end] in " \t\r\n,]":
+                    yield item
+                    position = end
+                    continue
+
+            chunk = file.read(chunk_size)
+            if not chunk:
+                if not started:
+                    return
+                raise ValueError(f"{path} ends in the middle of the array")
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def write_json(path, data):
+    #write to a temporary file first so a crash never leaves a half written file
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temp_path, path)
+    return size
+
+
+def journal_transactions(entry):
+    #journals from before carts were stored hold a single transaction per line
+    if 'transaction' in entry:
+        return entry['position'], [entry['transaction']]
+    return entry.get('position'), entry.get('transactions', ())
+
+
+class JsonStorage:
+    #journal records carry their position in the transaction list; it comes from
+    #history_length, and only needs the history loaded while that is unknown
+    needs_history = True
+
+    def __init__(self, users_path="users.json", products_path="products.json",
+                 transactions_path="transactions.json", journal=None, binary_snapshot=False):
+        self.users_path = users_path
+        self.products_path = products_path
+        self.transactions_path = transactions_path
+        self.journal = journal if journal is not None else Journal()
+        #also keep transactions.json as a binary copy that loads without parsing
+        self.binary_snapshot = binary_snapshot
+        self.snapshot_path = transactions_path + ".bin"
+        #number of transactions in transactions.json and the journal together
+        self.history_length = None
+        self.compaction = None
+        self.compaction_error = None
+        self.files_written = 0
+
+    @property
+    def bytes_written(self):
+        return self.files_written + self.journal.bytes_written
+
+    def load(self):
+        users = {}
+        try:
+            for user_data in iter_json_array(self.users_path):
+                user = user_from_data(user_data)
+                if user is not None:
+                    users[user.username] = user
+        except FileNotFoundError:
+            pass
+
+        products = {}
+        try:
+            for product_data in iter_json_array(self.products_path):
+                product = product_from_data(product_data)
+                products[product.product_index] = product
+        except FileNotFoundError:
+            pass
+
+        self.replay_journal(users, products)
+        return users, products
+
+    def replay_journal(self, users, products):
+        #budgets and stock are needed straight away, the purchases wait for load_transactions
+        base, entries = self.journal_entries()
+        self.history_length = self.history_start(base, entries)
+        if self.history_length is None and not entries:
+            self.history_length = self.snapshot_length()
+        for entry in entries:
+            if 'username' not in entry:
+                continue
+            position, transactions_data = journal_transactions(entry)
+            if position is not None and position == self.history_length:
+                self.history_length += len(transactions_data)
+
+            user = users.get(entry['username'])
+            if isinstance(user, Customer):
+                user.membership_level = entry['membership_level']
+                user.budget = entry['budget']
+            for product_index, stock in entry.get('stock', ()):
+                product = products.get(product_index)
+                if product is not None:
+                    product.stock = stock
+        if self.journal.base is None and not entries:
+            #start the journal with the count, so the next start knows it as well
+            self.journal.base = self.history_length
+
+    def journal_entries(self):
+        #a compaction that did not finish leaves its records in old_path,
+        #they come before the ones written since
+        old_base, old_entries = self.journal.read(self.journal.old_path)
+        entries = self.journal.replay()
+        if os.path.exists(self.journal.old_path):
+            return old_base, old_entries + entries
+        return self.journal.base, entries
+
+    def history_start(self, base, entries, count=False):
+        #the number of transactions in transactions.json before the journal's;
+        #with count the file is read when nothing on record says, else it is None
+        markers = [entry['compact'] for entry in entries if 'compact' in entry]
+        if markers:
+            marker = markers[-1]
+            if not self.transactions_torn():
+                return marker['after']
+            #recorded first, so the file is not taken as whole once it is cut back
+            self.journal.mark({'compact': dict(marker, after=marker['before'])})
+            self.cut_transactions(marker['offset'])
+            return marker['before']
+        if base is not None or not count:
+            return base
+        try:
+            return sum(1 for _ in iter_json_array(self.transactions_path))
+        except FileNotFoundError:
+            return 0
+
+    def transactions_torn(self):
+        #an append a crash cut short leaves transactions.json without its closing bracket
+        with open(self.transactions_path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(0, file.tell() - 8))
+            return not file.read().endswith(b"}\n]")
+
+    def cut_transactions(self, offset):
+        #back to where the append started, the journal appends those transactions again
+        with open(self.transactions_path, "r+b") as file:
+            file.truncate(offset)
+            file.seek(offset)
+            file.write(b"\n]")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def snapshot_length(self):
+        #the number of transactions in transactions.json without reading it,
+        #None when that is not known
+        if not os.path.exists(self.transactions_path):
+            return 0
+        if not self.binary_snapshot:
+            return None
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                if json.loads(file.readline()) != self.snapshot_source():
+                    return None
+                return json.loads(file.readline())['rows']
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    def load_transactions(self):
+        #the file may still be appended to by a compaction
+        self.wait_for_compaction()
+        base, entries = self.journal_entries()
+        self.history_start(base, entries)
+        transactions = self.read_snapshot()
+        if transactions is None:
+            transactions = TransactionStore()
+            try:
+                for transaction_data in iter_json_array(self.transactions_path):
+                    transactions.add(transaction_data['username'], transaction_data['product_index'],
+                                     transaction_data['quantity'], transaction_data['total_cost'],
+                                     transaction_data['discount'], transaction_data['discounted_cost'],
+                                     transaction_data['final_cost'], transaction_data['date'])
+            except FileNotFoundError:
+                pass
+            else:
+                if self.binary_snapshot:
+                    #the next start can skip parsing
+                    self.write_snapshot(transactions)
+
+        #purchases made since the start are only in the journal as well
+        for entry in entries:
+            position, transactions_data = journal_transactions(entry)
+            #records that already made it into transactions.json before a
+            #crash are skipped, so replaying a log twice is harmless
+            if position is not None and position == len(transactions):
+                transactions.extend(transaction_from_data(transaction_data)
+                                    for transaction_data in transactions_data)
+        self.history_length = len(transactions)
+        return transactions
+
+    def snapshot_source(self):
+        #the binary copy is only trusted while transactions.json is unchanged
+        status = os.stat(self.transactions_path)
+        return [status.st_size, status.st_mtime_ns]
+
+    def read_snapshot(self):
+        if not self.binary_snapshot:
+            return None
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                if json.loads(file.readline()) != self.snapshot_source():
+                    return None
+                return TransactionStore.read(file)
+        except (FileNotFoundError, ValueError, EOFError):
+            return None
+
+    def write_snapshot(self, transactions, rows=None):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(json.dumps(self.snapshot_source()).encode() + b"\n")
+            transactions.write(file, rows)
+            self.files_written += file.tell()
+        os.replace(temp_path, self.snapshot_path)
+
+    def save(self, users, products, transactions, changed):
+        changed = set(changed)
+        self.wait_for_compaction()
+        error, self.compaction_error = self.compaction_error, None
+        if error is not None:
+            #its records are still in the old journal, the next save tries again
+            raise error
+        if transactions is None:
+            changed.discard('transactions')
+
+        #the journal's budgets and stock would be replayed over newer files, so
+        #users.json and products.json are written by the compaction while it has records
+        if self.journal.entries or os.path.exists(self.journal.old_path):
+            self.start_compaction(users, products, transactions)
+            if 'transactions' not in changed:
+                return
+            self.wait_for_compaction()
+            error, self.compaction_error = self.compaction_error, None
+            if error is not None:
+                raise error
+
+        if 'users' in changed:
+            self.files_written += write_json(self.users_path, [user_to_data(user) for user in users.values()])
+        if 'products' in changed:
+            self.files_written += write_json(self.products_path,
+                                             [product_to_data(product) for product in products.values()])
+        if 'transactions' in changed:
+            self.files_written += write_json(self.transactions_path,
+                                             [transaction_to_data(transaction) for transaction in transactions])
+            if self.binary_snapshot:
+                self.write_snapshot(transactions)
+            self.journal.reset(len(transactions))
+            self.history_length = len(transactions)
+
+    def start_compaction(self, users, products, transactions):
+        #only the copies are made under the shop's write lock, a thread writes
+        #the files so the purchase that filled the journal does not wait for them
+        users_data = [user_to_data(user) for user in users.values()]
+        products_data = [product_to_data(product) for product in products.values()]
+        rows = None if transactions is None else len(transactions)
+        self.journal.rotate(self.history_length)
+        self.compaction = threading.Thread(target=self.compact, name="journal compaction",
+                                           args=(users_data, products_data, transactions, rows))
+        self.compaction.start()
+
+    def compact(self, users_data, products_data, transactions, rows):
+        try:
+            base, entries = self.journal.read(self.journal.old_path)
+            length = self.append_transactions(self.history_start(base, entries, count=True), entries)
+            self.files_written += write_json(self.users_path, users_data)
+            self.files_written += write_json(self.products_path, products_data)
+            if self.binary_snapshot and rows == length:
+                self.write_snapshot(transactions, rows)
+            #everything in the old journal is now part of the snapshot
+            os.remove(self.journal.old_path)
+        except BaseException as error:
+            self.compaction_error = error
+
+    def append_transactions(self, length, entries):
+        #adds the journal's purchases to the end of transactions.json, the ones
+        #already in it are not rewritten; returns how many the file then holds
+        rows = []
+        for entry in entries:
+            position, transactions_data = journal_transactions(entry)
+            if position is not None and position == length + len(rows):
+                rows.extend(transactions_data)
+        if not rows:
+            return length
+        if length == 0:
+            self.files_written += write_json(self.transactions_path, rows)
+            return len(rows)
+
+        text = "".join(",\n    " + json.dumps(row, indent=4).replace("\n", "\n    ") for row in rows) + "\n]"
+        with open(self.transactions_path, "r+b") as file:
+            file.seek(0, os.SEEK_END)
+            tail_start = max(0, file.tell() - 64)
+            file.seek(tail_start)
+            offset = tail_start + file.read().rindex(b"}") + 1
+            #on disk before the append, so a crash in the middle can be undone
+            self.journal.mark({'compact': {'offset': offset, 'before': length, 'after': length + len(rows)}})
+            file.seek(offset)
+            file.write(text.encode())
+            file.truncate()
+            file.flush()
+            os.fsync(file.fileno())
+        self.files_written += len(text)
+        return length + len(rows)
+
+    def wait_for_compaction(self):
+        if self.compaction is not None:
+            self.compaction.join()
+            self.compaction = None
+
+    def add_user(self, user):
+        pass
+
+    def update_customer(self, customer, transactions=(), position=None, products=()):
+        entry = {
+            'username': customer.username,
+            'membership_level': customer.membership_level,
+            'budget': customer.budget
+        }
+        #a whole cart goes into one journal line, so it is replayed all or nothing
+        if transactions:
+            entry['position'] = position
+            entry['transactions'] = [transaction_to_data(transaction) for transaction in transactions]
+            if position == self.history_length:
+                self.history_length += len(transactions)
+        if products:
+            #stock levels after the purchase, replayed onto products.json
+            entry['stock'] = [[product.product_index, product.stock] for product in products]
+        return self.journal.append(entry)
+
+    #users.json is rewritten by the next save
+    def update_passwords(self, users):
+        pass
+
+    #products only change through admin actions, which save the whole file
+    def save_products(self, products):
+        pass
+
+    def delete_products(self, product_indexes):
+        pass
+
+    def close(self):
+        self.wait_for_compaction()
+        self.journal.close()
+
+
+class SqliteStorage:
+    needs_history = False
+    #sqlite writes its own pages, the bytes are not counted
+    bytes_written = 0
+
+    def __init__(self, path="shop.db"):
+        self.path = path
+        #OnlineShop serializes writes itself, so the connection may be shared by threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "username TEXT PRIMARY KEY, password TEXT NOT NULL, role TEXT NOT NULL, "
+                "name TEXT NOT NULL, membership_level INTEGER, budget REAL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                "product_index INTEGER PRIMARY KEY, product_name TEXT NOT NULL, price REAL NOT NULL, "
+                "manufacturer TEXT NOT NULL, remarks TEXT NOT NULL, stock INTEGER)")
+            #databases created before stock was kept, their products are left untracked (NULL)
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(products)")]
+            if 'stock' not in columns:
+                self.connection.execute("ALTER TABLE products ADD COLUMN stock INTEGER")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS transactions ("
+                "id INTEGER PRIMARY KEY, username TEXT NOT NULL, product_index INTEGER NOT NULL, "
+                "quantity INTEGER NOT NULL, total_cost REAL NOT NULL, discount REAL NOT NULL, "
+                "discounted_cost REAL NOT NULL, final_cost REAL NOT NULL, date TEXT NOT NULL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_username ON transactions (username)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_product_index ON transactions (product_index)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date)")
+
+    def load(self):
+        users = {}
+        for row in self.connection.execute(
+                "SELECT username, password, role, name, membership_level, budget FROM users ORDER BY rowid"):
+            user = user_from_data({'username': row[0], 'password': row[1], 'role': row[2], 'name': row[3],
+                                   'membership_level': row[4], 'budget': row[5]})
+            if user is not None:
+                users[user.username] = user
+
+        products = {}
+        for row in self.connection.execute(
+                "SELECT product_index, product_name, price, manufacturer, remarks, stock FROM products"):
+            products[row[0]] = Product(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5])
+        return users, products
+
+    def load_transactions(self):
+        transactions = TransactionStore()
+        for row in self.connection.execute(
+                "SELECT username, product_index, quantity, total_cost, discount, discounted_cost, "
+                "final_cost, date FROM transactions ORDER BY id"):
+            transactions.add(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7].split())
+        return transactions
+
+    #every change is written as it happens, so there is nothing left to save
+    def save(self, users, products, transactions, changed):
+        pass
+
+    def add_user(self, user):
+        with self.connection:
+            self.insert_users([user])
+
+    def update_customer(self, customer, transactions=(), position=None, products=()):
+        #the budget change, its purchases and the stock they took are committed together or not at all
+        with self.connection:
+            self.connection.execute(
+                "UPDATE users SET membership_level = ?, budget = ? WHERE username = ?",
+                (customer.membership_level, customer.budget, customer.username))
+            if transactions:
+                self.insert_transactions(transactions)
+            if products:
+                self.connection.executemany("UPDATE products SET stock = ? WHERE product_index = ?",
+                                            [(product.stock, product.product_index) for product in products])
+        return False
+
+    def update_passwords(self, users):
+        with self.connection:
+            self.connection.executemany("UPDATE users SET password = ? WHERE username = ?",
+                                        [(user.password, user.username) for user in users])
+
+    def save_products(self, products):
+        with self.connection:
+            self.insert_products(products)
+
+    def delete_products(self, product_indexes):
+        with self.connection:
+            self.connection.executemany("DELETE FROM products WHERE product_index = ?",
+                                        [(product_index,) for product_index in product_indexes])
+
+    def replace_all(self, users, products, transactions):
+        with self.connection:
+            self.connection.execute("DELETE FROM users")
+            self.connection.execute("DELETE FROM products")
+            self.connection.execute("DELETE FROM transactions")
+            self.insert_users(users.values())
+            self.insert_products(products.values())
+            self.insert_transactions(transactions)
+
+    def insert_users(self, users):
+        rows = []
+        for user in users:
+            user_data = user_to_data(user)
+            rows.append((user_data['username'], user_data['password'], user_data['role'], user_data['name'],
+                         user_data.get('membership_level'), user_data.get('budget')))
+        self.connection.executemany("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def insert_products(self, products):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?)",
+            ((product.product_index, product.product_name, product.price, product.manufacturer,
+              json.dumps(list(product.remarks)), product.stock) for product in products))
+
+    def insert_transactions(self, transactions):
+        self.connection.executemany(
+            "INSERT INTO transactions (username, product_index, quantity, total_cost, discount, "
+            "discounted_cost, final_cost, date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((transaction.username, transaction.product_index, transaction.quantity, transaction.total_cost,
+              transaction.discount, transaction.discounted_cost, transaction.final_cost,
+              " ".join(transaction.date)) for transaction in transactions))
+
+    def close(self):
+        self.connection.close()
+
+
+def migrate_json_to_sqlite(json_storage, sqlite_storage):
+    users, products = json_storage.load()
+    transactions = json_storage.load_transactions()
+    sqlite_storage.replace_all(users, products, transactions)
+    return len(users), len(products), len(transactions)
@@ -1,4 +1,7 @@
 class Transaction:
+    __slots__ = ('username', 'product_index', 'quantity', 'total_cost', 'discount',
+                 'discounted_cost', 'final_cost', 'date')
+
     def __init__(self, username, product_index, quantity, total_cost, discount,discounted_cost, final_cost, date):
         self.username = username
         self.product_index = product_index
@@ -0,0 +1,96 @@
+import datetime
+import json
+from array import array
+from transaction import Transaction
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def date_to_timestamp(date):
+    #("2023-12-21", "14:48:04") -> seconds since 1970, local time taken as is
+    return (datetime.datetime.fromisoformat(" ".join(date)) - EPOCH) // datetime.timedelta(seconds=1)
+
+
+def timestamp_to_date(timestamp):
+    return tuple((EPOCH + datetime.timedelta(seconds=timestamp)).isoformat(" ").split())
+
+
+#Transactions kept column by column in typed arrays instead of one object
+#per purchase. A row costs about 60 bytes; usernames are stored once and
+#referred to by number. Transaction objects are only built when a row is read.
+class TransactionStore:
+    def __init__(self, transactions=()):
+        self.names = []
+        self.name_ids = {}
+        self.user_ids = array('I')
+        self.product_indexes = array('q')
+        self.quantities = array('q')
+        self.total_costs = array('d')
+        self.discounts = array('d')
+        self.discounted_costs = array('d')
+        self.final_costs = array('d')
+        self.timestamps = array('q')
+        self.extend(transactions)
+
+    def columns(self):
+        return (self.user_ids, self.product_indexes, self.quantities, self.total_costs, self.discounts,
+                self.discounted_costs, self.final_costs, self.timestamps)
+
+    #binary snapshot: one json header line with the row count and usernames,
+    #then every column as raw machine-order array bytes
+    def write(self, file, rows=None):
+        #rows writes only the first rows, e.g. while more are being added
+        rows = len(self) if rows is None else rows
+        file.write(json.dumps({'rows': rows, 'names': list(self.names)}).encode() + b"\n")
+        for column in self.columns():
+            column[:rows].tofile(file)
+
+    @classmethod
+    def read(cls, file):
+        header = json.loads(file.readline())
+        store = cls()
+        store.names = header['names']
+        store.name_ids = {name: user_id for user_id, name in enumerate(store.names)}
+        for column in store.columns():
+            column.fromfile(file, header['rows'])
+        return store
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        return Transaction(self.names[self.user_ids[position]], self.product_indexes[position],
+                           self.quantities[position], self.total_costs[position], self.discounts[position],
+                           self.discounted_costs[position], self.final_costs[position],
+                           timestamp_to_date(self.timestamps[position]))
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def user_id(self, username):
+        user_id = self.name_ids.get(username)
+        if user_id is None:
+            user_id = self.name_ids[username] = len(self.names)
+            self.names.append(username)
+        return user_id
+
+    def add(self, username, product_index, quantity, total_cost, discount, discounted_cost, final_cost, date):
+        self.user_ids.append(self.user_id(username))
+        self.product_indexes.append(product_index)
+        self.quantities.append(quantity)
+        self.total_costs.append(total_cost)
+        self.discounts.append(discount)
+        self.discounted_costs.append(discounted_cost)
+        self.final_costs.append(final_cost)
+        self.timestamps.append(date_to_timestamp(date))
+
+    def append(self, transaction):
+        self.add(transaction.username, transaction.product_index, transaction.quantity, transaction.total_cost,
+                 transaction.discount, transaction.discounted_cost, transaction.final_cost, transaction.date)
+
+    def extend(self, transactions):
+        for transaction in transactions:
+            self.append(transaction)